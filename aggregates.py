@@ -0,0 +1,268 @@
+"""Precomputed aggregate tables shared by every dashboard plot function."""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import cube
+import instrumentation
+import investment
+import neighborhoods
+import ranking
+import spatial
+
+MEASURES = ['sale_price_sqr_foot', 'housing_units', 'gross_rent']
+
+# Filter selections kept per Aggregates, so reruns with the same filters
+# reuse them
+SELECTIONS = 32
+
+# _lock guards the dictionaries; the aggregates of each pair of source files
+# are built under a lock of their own, so building one city's never blocks
+# sessions of another
+_lock = threading.Lock()
+_cache = {}
+_source_locks = {}
+_selections_lock = threading.Lock()
+
+
+def cell_table(sfo_data):
+    """Per-(year, neighborhood) sums, non-null counts, minima and maxima of each measure.
+
+    This is the layout of the cell store kept by ingest.py: `<measure>_sum`,
+    `<measure>_count`, `<measure>_min` and `<measure>_max` columns per
+    measure. Every table in Aggregates is derived from it, so the raw rows
+    only need to be scanned once, and cell tables of separate chunks of rows
+    combine with merge_cells.
+    """
+    # Rows are grouped by a dense integer (year, neighborhood code) key
+    # rather than by hashing the names
+    data = sfo_data
+    dictionary, name_codes = neighborhoods.Dictionary.encode(data['neighborhood'])
+    year = (data.index if data.index.name == 'year' else data['year']).to_numpy()
+    named = name_codes >= 0
+    if not named.all():
+        data, year, name_codes = data[named], year[named], name_codes[named]
+    first_year = year.min() if len(year) else 0
+    keys = (year - first_year).astype('int64') * len(dictionary) + name_codes
+    size = (year.max() - first_year + 1) * len(dictionary) if len(year) else 0
+    cell_rows = np.bincount(keys, minlength=size)
+    present = np.flatnonzero(cell_rows)
+
+    sums, counts, minima, maxima = {}, {}, {}, {}
+    for measure in MEASURES:
+        # Measures may be stored as float32; accumulate in float64 so large
+        # sums such as housing_units stay exact
+        values = data[measure].to_numpy(dtype='float64')
+        valid = ~np.isnan(values)
+        if valid.all():
+            sums[f'{measure}_sum'] = np.bincount(keys, values, size)[present]
+            counts[f'{measure}_count'] = cell_rows[present]
+        else:
+            sums[f'{measure}_sum'] = np.bincount(keys[valid], values[valid], size)[present]
+            counts[f'{measure}_count'] = np.bincount(keys[valid], minlength=size)[present]
+        # fmin/fmax skip the NaN the cells start from
+        low, high = np.full(size, np.nan), np.full(size, np.nan)
+        np.fmin.at(low, keys, values)
+        np.fmax.at(high, keys, values)
+        minima[f'{measure}_min'] = low[present]
+        maxima[f'{measure}_max'] = high[present]
+    years, year_codes = np.unique(present // len(dictionary) + first_year, return_inverse=True)
+    index = pd.MultiIndex(levels=[years.astype(year.dtype), dictionary.names],
+                          codes=[year_codes, present % len(dictionary)],
+                          names=['year', 'neighborhood'])
+    return pd.DataFrame({**sums, **counts, **minima, **maxima}, index=index)
+
+
+def merge_cells(cells, delta):
+    """Cell table combining the cells of a delta cell table into cells.
+
+    Sums and counts are added and minima and maxima combined. Columns that
+    cells lacks (a store written before minima and maxima were kept) are
+    left out.
+    """
+    left, right = cells.align(delta[cells.columns], join='outer')
+    merged = {}
+    for column in cells.columns:
+        if column.endswith('_min'):
+            merged[column] = np.fmin(left[column], right[column])
+        elif column.endswith('_max'):
+            merged[column] = np.fmax(left[column], right[column])
+        else:
+            merged[column] = left[column].fillna(0) + right[column].fillna(0)
+    merged = pd.DataFrame(merged).sort_index()
+    counts = [f'{measure}_count' for measure in MEASURES]
+    merged[counts] = merged[counts].astype('int64')
+    return merged
+
+
+class Aggregates:
+    """Per-year, per-neighborhood, per-(year, neighborhood) and top-N tables."""
+
+    def __init__(self, cells, neighborhood_data=None, top_n=10, place=None):
+        # Name of the city, for plot titles
+        self.place = place
+        self.cell_sums = cells[[f'{measure}_sum' for measure in MEASURES]].set_axis(MEASURES, axis=1)
+        self.cell_counts = cells[[f'{measure}_count' for measure in MEASURES]].set_axis(MEASURES, axis=1)
+        self.by_year_neighborhood = self.cell_sums / self.cell_counts
+        self.by_year = self._mean('year')
+        self.by_neighborhood = self._mean('neighborhood')
+
+        # Neighborhood codes shared by the cube, the rankings and the
+        # coordinates join
+        index = cells.index.remove_unused_levels()
+        self.neighborhoods = neighborhoods.Dictionary(index.levels[index.names.index('neighborhood')])
+        name_codes = self.neighborhoods.level_codes(index, 'neighborhood')
+        self.cube = cube.Cube(cells, MEASURES, self.neighborhoods, name_codes)
+        self.ranker = ranking.Ranker(cells, self.neighborhoods, name_codes)
+        self.top_n = top_n
+        # Metric the top-N tables are ranked by
+        self.top_metric = 'sale_price_sqr_foot'
+        self.top_neighborhoods, self.top_by_year = self.top(self.top_metric, top_n)
+        self._selections = OrderedDict()
+        self.investment = investment.compute(self.cube.years, self.cube.neighborhoods,
+                                             self.cube.sums, self.cube.counts, MEASURES)
+
+        self.lat_lon = None
+        self.locations = None
+        self.location_index = None
+        if neighborhood_data is not None:
+            # Coordinates by neighborhood code, NaN for neighborhoods without any
+            self.lat_lon = np.full((len(self.neighborhoods), 2), np.nan)
+            coordinate_codes = self.neighborhoods.codes(neighborhood_data.index)
+            known = coordinate_codes >= 0
+            self.lat_lon[coordinate_codes[known]] = neighborhood_data[['Lat', 'Lon']].to_numpy()[known]
+            codes = self.neighborhoods.codes(self.by_neighborhood.index)
+            self.locations = self.locate(self.by_neighborhood, codes, self.investment.by_neighborhood.iloc[codes])
+            self.location_index = spatial.GridIndex(self.locations['Lat'], self.locations['Lon'])
+
+    def locate(self, table, codes, metrics=None):
+        """Coordinates joined to a per-neighborhood table by neighborhood code.
+
+        Neighborhoods missing from either table are dropped, see README.
+        metrics, row for row with table, adds investment columns that may be NaN.
+        """
+        lat_lon = pd.DataFrame(self.lat_lon[codes], index=table.index, columns=['Lat', 'Lon'])
+        columns = [lat_lon, table]
+        if metrics is not None:
+            columns.append(metrics.set_axis(table.index))
+        return pd.concat(columns, axis=1).dropna(subset=['Lat', 'Lon'] + list(table.columns))
+
+    def top(self, metric='sale_price_sqr_foot', n=10, years=None):
+        """Top n neighborhoods by metric and their per-year rows, within an optional year range.
+
+        The neighborhood means, and the ratio metrics derived from them, are
+        taken over the same year range the ranking used.
+        """
+        ranked = self.ranker.rank(metric, n, years)
+        codes = self.neighborhoods.codes(ranked.neighborhoods)
+        means = pd.DataFrame({measure: self.ranker.means(measure, years)[codes] for measure in MEASURES},
+                             index=pd.Index(ranked.neighborhoods, name='neighborhood'))
+        return ranking.add_ratios(means), self.by_year_neighborhood.iloc[ranked.rows]
+
+    def memory_usage(self):
+        """Approximate bytes held by the tables and arrays."""
+        frames = [self.cell_sums, self.cell_counts, self.by_year_neighborhood, self.by_year,
+                  self.by_neighborhood, self.top_by_year, self.locations,
+                  self.investment.by_neighborhood, self.investment.by_year_neighborhood]
+        total = sum(int(frame.memory_usage(deep=True).sum()) for frame in frames if frame is not None)
+        return total + self.cube.sums.nbytes + self.cube.counts.nbytes
+
+    def filtered(self, years=None, neighborhoods=None, metric='sale_price_sqr_foot'):
+        """The same tables for a year range and set of neighborhoods, ranked by metric.
+
+        The last SELECTIONS selections are cached, least recently used
+        evicted first; like the Aggregates they are shared and read-only.
+        """
+        key = (None if years is None else tuple(years), tuple(sorted(neighborhoods or ())), metric)
+        with _selections_lock:
+            selection = self._selections.get(key)
+            if selection is not None:
+                self._selections.move_to_end(key)
+                return selection
+        # Built outside the lock; two sessions asking at once both build it
+        selection = Selection(self, years, neighborhoods, metric)
+        with _selections_lock:
+            self._selections[key] = selection
+            while len(self._selections) > SELECTIONS:
+                self._selections.popitem(last=False)
+        return selection
+
+    def _mean(self, level):
+        sums = self.cell_sums.groupby(level=level, observed=True).sum()
+        counts = self.cell_counts.groupby(level=level, observed=True).sum()
+        return sums / counts
+
+
+class Selection:
+    """Aggregates tables for a filtered slice of the data, computed from the cube.
+
+    Has the attributes the plot functions read, so every view can be drawn
+    from a selection instead of the full Aggregates.
+    """
+
+    def __init__(self, aggs, years=None, neighborhoods=None, metric='sale_price_sqr_foot'):
+        self.place = aggs.place
+        year_values, codes, sums, counts = aggs.cube.select(years, neighborhoods)
+        names = aggs.neighborhoods.names[codes]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            by_year = sums.sum(axis=1) / counts.sum(axis=1)
+            by_neighborhood = sums.sum(axis=0) / counts.sum(axis=0)
+            cell_means = sums / counts
+
+        self.by_year = pd.DataFrame(by_year, index=pd.Index(year_values, name='year'), columns=MEASURES)
+        has_data = counts.sum(axis=(0, 2)) > 0
+        self.by_neighborhood = pd.DataFrame(by_neighborhood[has_data],
+                                            index=pd.Index(names[has_data], name='neighborhood'),
+                                            columns=MEASURES)
+        cell_years, cell_names = np.nonzero(counts.sum(axis=2) > 0)
+        cell_index = pd.MultiIndex.from_arrays([year_values[cell_years], names[cell_names]],
+                                               names=['year', 'neighborhood'])
+        self.by_year_neighborhood = pd.DataFrame(cell_means[cell_years, cell_names], index=cell_index, columns=MEASURES)
+
+        self.top_n = aggs.top_n
+        self.top_metric = metric
+        scores = ranking.metric_scores(metric, lambda measure: by_neighborhood[:, MEASURES.index(measure)])
+        top = ranking.top_positions(scores, self.top_n)
+        self.top_neighborhoods = ranking.add_ratios(pd.DataFrame(by_neighborhood[top],
+                                                                 index=pd.Index(names[top], name='neighborhood'),
+                                                                 columns=MEASURES))
+        self.top_by_year = self.by_year_neighborhood[np.isin(cell_names, top)]
+        metrics = investment.compute(year_values, names, sums, counts, MEASURES)
+        self.investment = investment.Metrics(metrics.by_neighborhood[has_data], metrics.by_year_neighborhood)
+
+        self.locations = None
+        self.location_index = None
+        if aggs.lat_lon is not None:
+            self.locations = aggs.locate(self.by_neighborhood, codes[has_data], self.investment.by_neighborhood)
+            self.location_index = spatial.GridIndex(self.locations['Lat'], self.locations['Lon'])
+
+
+def get_aggregates(dataset, place=None):
+    """Aggregates for a loaded dataset, computed once per version and shared across sessions."""
+    version = dataset.version
+    source = tuple(entry[0] for entry in version)
+    with _lock:
+        source_lock = _source_locks.setdefault(source, threading.Lock())
+    with source_lock:
+        with _lock:
+            cached = _cache.get(source)
+        if cached is not None and cached[0] == version and cached[1].place == place:
+            return cached[1]
+        cells = dataset.cells
+        if cells is None:
+            with instrumentation.span('aggregate.cells'):
+                cells = cell_table(dataset.sfo_data)
+        with instrumentation.span('aggregate.tables'):
+            aggs = Aggregates(cells, dataset.neighborhood_data, place=place)
+        with _lock:
+            # Replacing the entry for these source files drops the stale version
+            _cache[source] = (version, aggs)
+        return aggs
+
+
+def evict(dataset):
+    """Drop the cached aggregates of a dataset's source files."""
+    with _lock:
+        _cache.pop(tuple(entry[0] for entry in dataset.version), None)
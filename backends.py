@@ -0,0 +1,82 @@
+"""Deferred import and initialization of the plotting backends.
+
+Each backend is imported the first time a plot that needs it is built, so a
+session that only looks at the matplotlib views never pays for Bokeh or
+Plotly. Setting DASHBOARD_PRELOAD_BACKENDS=1 imports all of them at startup
+instead. import_times records how long each backend took to load.
+"""
+import os
+import threading
+import time
+
+import_times = {}
+
+_lock = threading.Lock()
+_modules = {}
+
+
+def _init_matplotlib():
+    # Figures are drawn on Agg canvases directly and never registered with
+    # pyplot, see mpl_figures
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    return Figure, FigureCanvasAgg
+
+
+def _init_holoviews():
+    import hvplot.pandas  # noqa: F401, registers the .hvplot accessor
+    import holoviews as hv
+    hv.extension('bokeh', logo=False)
+    return hv
+
+
+def _init_plotly():
+    import plotly.express as px
+    from dotenv import load_dotenv
+
+    # Read the Mapbox API key
+    load_dotenv()
+    map_box_api = os.getenv("mapbox")
+    px.set_mapbox_access_token(map_box_api)
+    return px
+
+
+_BACKENDS = {'matplotlib': _init_matplotlib,
+             'holoviews': _init_holoviews,
+             'plotly': _init_plotly
+            }
+
+
+def _load(name):
+    with _lock:
+        module = _modules.get(name)
+        if module is None:
+            start = time.perf_counter()
+            module = _modules[name] = _BACKENDS[name]()
+            import_times[name] = time.perf_counter() - start
+        return module
+
+
+def matplotlib():
+    """matplotlib's Figure and FigureCanvasAgg classes."""
+    return _load('matplotlib')
+
+
+def holoviews():
+    """holoviews with the hvplot accessor registered and the Bokeh extension loaded."""
+    return _load('holoviews')
+
+
+def plotly_express():
+    """plotly.express with the Mapbox access token set."""
+    return _load('plotly')
+
+
+def preload():
+    """Import every backend now rather than on first use."""
+    for name in _BACKENDS:
+        _load(name)
+
+
+if os.getenv('DASHBOARD_PRELOAD_BACKENDS') == '1':
+    preload()
@@ -0,0 +1,159 @@
+"""Benchmark data loading, aggregation and every plot function on synthetic data.
+
+    python benchmark.py [--neighborhoods 200] [--years 7] [--rows 1]
+                        [--chunk-rows 100000] [--repeat 3] [--output results.json]
+
+A synthetic census of neighborhoods x years x rows-per-cell is written to a
+temporary directory in the same CSV layout as the Data folder. Loading, a
+streamed load of the census in chunks of --chunk-rows rows, aggregation
+and, for each plot function, figure construction and serialization are
+timed separately, with backend imports reported on their own. For Plotly
+views the size of plain figure JSON is reported next to the compacted
+payload that is actually cached. The results are printed (or written) as
+JSON so runs can be compared across releases.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import aggregates
+import backends
+import data_loader
+import figure_cache
+import plots
+
+# Rows per chunk of the streamed load unless CENSUS_CHUNK_ROWS sets one
+DEFAULT_CHUNK_ROWS = 100000
+
+
+def synthetic_census(neighborhoods, years, rows, seed=0):
+    """Census and coordinates frames shaped like the files in Data."""
+    rng = np.random.default_rng(seed)
+    names = np.array([f'Neighborhood {i}' for i in range(neighborhoods)])
+    year = np.repeat(np.arange(2010, 2010 + years), neighborhoods * rows)
+    neighborhood = np.tile(np.repeat(names, rows), years)
+    base_price = rng.uniform(150, 900, neighborhoods)
+    growth = rng.uniform(0.0, 0.1, neighborhoods)
+    code = np.tile(np.repeat(np.arange(neighborhoods), rows), years)
+    size = len(year)
+    price = base_price[code] * (1 + growth[code]) ** (year - 2010) * rng.normal(1, 0.05, size)
+    # Housing units and gross rent are city-wide yearly values in the real data
+    units = (372560 + 1800 * (year - 2010)).astype('int64')
+    rent = (1239 * 1.2 ** (year - 2010)).round().astype('int64')
+    census = pd.DataFrame({'year': year,
+                           'neighborhood': neighborhood,
+                           'sale_price_sqr_foot': price,
+                           'housing_units': units,
+                           'gross_rent': rent
+                          })
+    coordinates = pd.DataFrame({'Neighborhood': names,
+                                'Lat': rng.uniform(37.70, 37.81, neighborhoods),
+                                'Lon': rng.uniform(-122.51, -122.38, neighborhoods)
+                               })
+    return census, coordinates
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def _summary(samples):
+    return {'min': min(samples), 'median': statistics.median(samples), 'max': max(samples)}
+
+
+def run(neighborhoods, years, rows, repeat=3, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Timings in seconds for one synthetic dataset size."""
+    census, coordinates = synthetic_census(neighborhoods, years, rows)
+    with tempfile.TemporaryDirectory() as directory:
+        census_path = Path(directory) / 'census.csv'
+        coordinates_path = Path(directory) / 'coordinates.csv'
+        census.to_csv(census_path, index=False)
+        coordinates.to_csv(coordinates_path, index=False)
+
+        load = []
+        for i in range(repeat):
+            # A new file name per repeat, so every load is a cache miss
+            path = census_path.with_name(f'census{i}.csv')
+            path.write_bytes(census_path.read_bytes())
+            dataset, seconds = _timed(lambda: data_loader.load_dataset(path, coordinates_path))
+            load.append(seconds)
+
+        streamed_load = []
+        for _ in range(repeat):
+            _, seconds = _timed(lambda: data_loader.stream_cells(census_path, chunk_rows))
+            streamed_load.append(seconds)
+
+    # With CENSUS_CHUNK_ROWS set the census is loaded as its cell table
+    # already, and only the tables are left to aggregate
+    if dataset.cells is not None:
+        aggregate = lambda: aggregates.Aggregates(dataset.cells, dataset.neighborhood_data)
+    else:
+        aggregate = lambda: aggregates.Aggregates(aggregates.cell_table(dataset.sfo_data), dataset.neighborhood_data)
+    aggregation = []
+    for _ in range(repeat):
+        aggs, seconds = _timed(aggregate)
+        aggregation.append(seconds)
+
+    results = {}
+    for name, kwargs in plots.default_views(aggs):
+        plot = getattr(plots, name)
+        # One untimed render first, so backend imports are not counted
+        figure_cache.serialize(plot(aggs, **kwargs))
+        build, serialize = [], []
+        for _ in range(repeat):
+            fig, seconds = _timed(lambda: plot(aggs, **kwargs))
+            build.append(seconds)
+            entry, seconds = _timed(lambda: figure_cache.serialize(fig))
+            serialize.append(seconds)
+        results[name] = {'build': _summary(build),
+                         'serialize': _summary(serialize),
+                         'payload_bytes': len(entry.payload)
+                        }
+        if entry.kind == 'plotly':
+            results[name]['uncompacted_payload_bytes'] = len(fig.to_json())
+
+    return {'dataset': {'neighborhoods': neighborhoods, 'years': years, 'rows_per_cell': rows,
+                        'rows': len(census), 'chunk_rows': chunk_rows},
+            'load': _summary(load),
+            'streamed_load': _summary(streamed_load),
+            'aggregation': _summary(aggregation),
+            'plots': results,
+            'backend_imports': dict(backends.import_times)
+           }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--neighborhoods', type=int, default=200)
+    parser.add_argument('--years', type=int, default=7)
+    parser.add_argument('--rows', type=int, default=1, help='rows per (year, neighborhood) cell')
+    parser.add_argument('--chunk-rows', type=int, default=data_loader.CHUNK_ROWS or DEFAULT_CHUNK_ROWS,
+                        help='rows per chunk of the streamed load')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+
+    report = run(args.neighborhoods, args.years, args.rows, args.repeat, args.chunk_rows)
+    report['environment'] = {'python': platform.python_version(),
+                             'pandas': pd.__version__,
+                             'numpy': np.__version__
+                            }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + '\n')
+    else:
+        sys.stdout.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
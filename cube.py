@@ -0,0 +1,46 @@
+"""Dense (year x neighborhood x measure) cube of sums and counts.
+
+Built once per data version from the cell table, so any year range and
+neighborhood filter is answered by slicing and summing NumPy arrays instead
+of filtering and grouping the raw rows.
+"""
+import numpy as np
+
+
+class Cube:
+    """Sums and non-null counts of each measure, indexed by year, neighborhood and measure."""
+
+    def __init__(self, cells, measures, dictionary, name_codes):
+        years = cells.index.get_level_values('year').to_numpy()
+        self.years, year_index = np.unique(years, return_inverse=True)
+        # The neighborhood axis is indexed by the dictionary's codes
+        self.dictionary = dictionary
+        self.neighborhoods = dictionary.names
+        self.measures = list(measures)
+
+        shape = (len(self.years), len(self.neighborhoods), len(self.measures))
+        self.sums = np.zeros(shape)
+        self.counts = np.zeros(shape)
+        self.sums[year_index, name_codes] = cells[[f'{m}_sum' for m in self.measures]].to_numpy(dtype='float64')
+        self.counts[year_index, name_codes] = cells[[f'{m}_count' for m in self.measures]].to_numpy(dtype='float64')
+
+    def year_slice(self, years=None):
+        """Slice of the year axis for an inclusive (first, last) range."""
+        if years is None:
+            return slice(None)
+        start = np.searchsorted(self.years, years[0], side='left')
+        stop = np.searchsorted(self.years, years[1], side='right')
+        return slice(int(start), int(stop))
+
+    def neighborhood_codes(self, neighborhoods=None):
+        """Sorted codes of the named neighborhoods, or of all of them."""
+        if not neighborhoods:
+            return np.arange(len(self.neighborhoods))
+        codes = self.dictionary.codes(neighborhoods)
+        return np.unique(codes[codes >= 0])
+
+    def select(self, years=None, neighborhoods=None):
+        """(years, neighborhood codes, sums, counts) of a sub-cube."""
+        rows = self.year_slice(years)
+        codes = self.neighborhood_codes(neighborhoods)
+        return self.years[rows], codes, self.sums[rows][:, codes], self.counts[rows][:, codes]
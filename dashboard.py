@@ -1,216 +1,110 @@
-import streamlit as st
-import plotly.express as px
-import pandas as pd
-import hvplot.pandas
-import matplotlib.pyplot as plt
 import os
-from pathlib import Path
-from dotenv import load_dotenv
-import holoviews as hv
-hv.extension('bokeh', logo=False)
+import time
+import streamlit as st
+import streamlit.components.v1 as components
+import backends
+import data_loader
+import datasets
+import figure_cache
+import instrumentation
+import investment
+import plots
+import ranking
+import warmup
 
-# Read the Mapbox API key
-load_dotenv()
-map_box_api = os.getenv("mapbox")
-px.set_mapbox_access_token(map_box_api)
+# Plotting libraries are imported on first use through backends, which also
+# reads the Mapbox API key when Plotly is loaded
 
-# Import the necessary CSVs to Pandas DataFrames
-file_path = Path("Data/neighborhoods_coordinates.csv")
-neighborhood_data = pd.read_csv(file_path)
-neighborhood_data = neighborhood_data.rename(columns={'Neighborhood': 'neighborhood'}).set_index('neighborhood')
+# Timing spans are collected for every rerun; ?debug=1 or DASHBOARD_DEBUG=1
+# shows them in the sidebar, with an optional profile of the whole rerun
+debug = os.getenv('DASHBOARD_DEBUG') == '1' or st.experimental_get_query_params().get('debug') == ['1']
+if os.getenv('DASHBOARD_METRICS_PORT'):
+    instrumentation.start_metrics_server(int(os.getenv('DASHBOARD_METRICS_PORT')))
+instrumentation.start_run()
+profiler = None
+if debug and st.sidebar.checkbox('Profile this rerun'):
+    profiler = instrumentation.RunProfiler()
+    profiler.start()
 
-file_path = Path("Data/sfo_neighborhoods_census_data.csv")
-sfo_data = pd.read_csv(file_path, index_col="year")
+# The city to show, from the dataset registry (Data/datasets.json)
+cities = datasets.registry.cities
+city_key = next(iter(cities))
+if len(cities) > 1:
+    with st.sidebar:
+        city_key = st.selectbox("City:", list(cities), format_func=lambda key: cities[key].name)
+city = cities[city_key]
 
-# Define Panel Visualization Functions
-def housing_units_per_year():
-    """Housing Units Per Year."""
-    yearly_avg_units = sfo_data['housing_units'].groupby('year').mean()
-    min = yearly_avg_units.min()
-    max = yearly_avg_units.max()
-    std = yearly_avg_units.std()
-    fig = plt.figure()
-    yearly_avg_units.plot(kind='bar', 
-                          xlabel='Year', 
-                          ylim=[min-std, max+std],
-                          title='Housing Units in San Francisco 2010-2016'
-                         )
-    return fig
+# Import the necessary CSVs to Pandas DataFrames, parsed once per process and
+# shared by all sessions until the files change. Only the columns the
+# aggregates need are read, from the columnar store if ingest.py has built one,
+# and the census rows are skipped entirely when its cell store is current.
+# Aggregate tables are computed once per version of the CSVs and shared by
+# all plots; each city keeps its own data, aggregates and figure cache
+workspace = datasets.registry.open(city_key)
+census_path = city.census_path
+coordinates_path = city.coordinates_path
+dataset = workspace.dataset
+data_version = dataset.version
+aggs = workspace.aggs
 
-def average_gross_rent():
-    """Average Gross Rent in San Francisco Per Year."""
-    rent_plot = sfo_data['gross_rent'].groupby('year').mean()
-    fig = plt.figure()
-    rent_plot.plot(ylabel='Gross Rent',
-                   xlabel='Year',
-                   marker='o', 
-                   title='Average Gross Rent by Year', 
-                   color='red'
-                  )
-    return fig
+# With DASHBOARD_WARMUP_WORKERS set, every view of a new data version is
+# rendered in a background process pool
+if warmup.warmer is not None:
+    warmup.warmer.start(census_path, coordinates_path, data_version, plots.default_views(aggs),
+                        workspace.figures, city.name)
 
-def average_sales_price():
-    """Average Sales Price Per Year."""
-    price_plot = sfo_data['sale_price_sqr_foot'].groupby('year').mean()
-    fig = plt.figure()
-    price_plot.plot(ylabel='Sale Price per SqFt',
-                    xlabel='Year',
-                    marker='o', 
-                    title='Average Sale Price per SqFt by Year'
-                   )
-    return fig
+# Cached figures are served as static images, or as JSON embedded with the
+# matching Plotly/Bokeh JavaScript
+def cached_figure(plot, **params):
+    """Figure for a plot function, rendered once per parameters and data version."""
+    key = figure_cache.figure_key(plot.__name__, params, view_version)
+    if warmup.warmer is not None and warmup.warmer.is_pending(key):
+        # Show progress and check again shortly rather than rendering it twice
+        done, total = warmup.warmer.progress(data_version)
+        st.progress(done / total, text=f'Rendering views in the background ({done} of {total} ready)')
+        time.sleep(0.5)
+        st.experimental_rerun()
 
-def average_rent_and_price():
-    """Average Gross Rent and Sale Price on same plot"""
-    # create subplot and right y axis objects with subplots() and twinx()
-    fig,ax = plt.subplots()
-    ax2=ax.twinx()
-    
-    # set labels for y axes
-    ax.set_ylabel('Sale Price per SqFt', color='blue', fontsize = 14)
-    ax2.set_ylabel('Gross Rent', color='red', fontsize = 14)
-    
-    # Sale price left y axis subplot with x axis label and title for full plot
-    price_plot = sfo_data['sale_price_sqr_foot'].groupby('year').mean()
-    price_plot.plot(title='Sales Price (blue, left) and Gross Rent (red, right) by Year',
-                    xlabel='Year',
-                    color="blue", 
-                    marker="o",
-                    ax=ax
-                   )
-    # Gross Rent right y axis subplot
-    rent_plot = sfo_data['gross_rent'].groupby('year').mean()
-    rent_plot.plot(color='red', 
-                   marker='o',
-                   ax=ax2)
-    
-    return fig
-    
-def average_price_by_neighborhood():
-    """Average Prices by Neighborhood."""
-    sfo_grouped = sfo_data.groupby(['year', 'neighborhood']).mean().reset_index()
-    fig = sfo_grouped.hvplot.line(x='year',
-                                  xlabel='Year', 
-                                  y='sale_price_sqr_foot', 
-                                  ylabel='Mean Sale Price per Sq Ft',
-                                  groupby='neighborhood'
-                                 )
-    return hv.render(fig)
+    def render():
+        with instrumentation.span('figure.build', plot=plot.__name__):
+            return plot(view, **params)
 
-def average_rent_by_neighborhood():
-    sfo_grouped = sfo_data.groupby(['year', 'neighborhood']).mean().reset_index()
-    fig = sfo_grouped.hvplot.line(x='year', 
-                                  xlabel='Year',
-                                  y='gross_rent',
-                                  ylabel='Mean Gross Rent',
-                                  groupby='neighborhood'
-                                 )
-    return hv.render(fig)
+    return workspace.figures.get_or_render(key, render)
 
-def top_most_expensive_neighborhoods():
-    """Top 10 Most Expensive Neighborhoods."""
-    top_10 = sfo_data.groupby('neighborhood').mean().nlargest(10, 'sale_price_sqr_foot').reset_index()
-    fig = top_10.hvplot.bar(x='neighborhood',
-                            xlabel='Neighborhood',
-                            rot=37,
-                            y='sale_price_sqr_foot',
-                            ylabel='Mean Sale Price per Sq Ft,',
-                            title='Top 10 Most Expensive San Francisco Neighborhoods, Avg 2010-2016',
-                            frame_width=600,
-                            frame_height=250
-                           )
-    return hv.render(fig)
+def show_figure(figure):
+    """Display a figure from the figure cache."""
+    with instrumentation.span('display', kind=figure.kind):
+        if figure.kind == 'png':
+            st.image(figure.payload, use_column_width=True)
+        else:
+            components.html(figure_cache.embed_html(figure), height=figure.height)
 
-def most_expensive_neighborhoods_rent_sales():
-    """Comparison of Rent and Sales Prices of Most Expensive Neighborhoods."""
-    top_10 = sfo_data.groupby('neighborhood').mean().nlargest(10, 'sale_price_sqr_foot').reset_index()
-    top_10_full =  sfo_data[sfo_data['neighborhood'].isin(top_10.neighborhood)]
-    top_10_full_1 = top_10_full.drop(columns='housing_units').rename(columns={'sale_price_sqr_foot' : 'Mean Sales Price per Sq Ft', 'gross_rent' : 'Gross Rent' })
-    fig = top_10_full_1.hvplot.bar(x='year', 
-                                   rot=90, 
-                                   groupby='neighborhood',
-                                   height=500,
-                                   title='Sale Price and Rent of 10 Most Expensive Neighborhoods, yearly 2010-2016'
-                                  )
-    return hv.render(fig)
-    
-def parallel_coordinates():
-    """Parallel Coordinates Plot."""
-    top_10 = sfo_data.groupby('neighborhood').mean().nlargest(10, 'sale_price_sqr_foot').reset_index()
-    top_10['gross_rent'] = top_10['gross_rent'].round(2)
-    top_10['sale_price_sqr_foot'] = top_10['sale_price_sqr_foot'].round(2)
-    fig = px.parallel_coordinates(top_10,
-                                  title='Parallel Coordinates',
-                                  dimensions=['sale_price_sqr_foot', 
-                                              'housing_units', 
-                                              'gross_rent'
-                                             ],
-                                  color='sale_price_sqr_foot',
-                                  color_continuous_scale=px.colors.sequential.Inferno,
-                                  labels={"sale_price_sqr_foot": "Sale Price per Sq Ft",
-                                          "housing_units": "Housing Units",
-                                          "gross_rent": 'Gross Rent'
-                                         },
-                                 )
-    return fig
+def neighborhood_choice():
+    """Neighborhood picked in the sidebar; only its series is sent to the browser."""
+    with st.sidebar:
+        return st.selectbox("Neighborhood:", list(view.by_neighborhood.index))
 
-def parallel_categories():
-    """Parallel Categories Plot."""
-    top_10 = sfo_data.groupby('neighborhood').mean().nlargest(10, 'sale_price_sqr_foot').reset_index()
-    top_10['gross_rent'] = top_10['gross_rent'].round(2)
-    top_10['sale_price_sqr_foot'] = top_10['sale_price_sqr_foot'].round(2)
-    fig = px.parallel_categories(top_10,
-                                 title='Parallel Categories',
-                                 dimensions=['neighborhood',
-                                             'sale_price_sqr_foot',
-                                             'housing_units',
-                                             'gross_rent'
-                                            ],
-                                 color='sale_price_sqr_foot',
-                                 color_continuous_scale=px.colors.sequential.Inferno,
-                                 labels={"neighborhood": "Neighborhood",
-                                         "sale_price_sqr_foot": "Sale Price per Sq Ft",
-                                         "housing_units": "Housing Units",
-                                         "gross_rent": 'Gross Rent'
-                                        }
-                                )
-    return fig
-                           
-def neighborhood_map():
-    """Neighborhood Map."""
-    sfon = sfo_data.groupby('neighborhood').mean()
-    sfo_location = pd.concat([neighborhood_data, sfon], axis=1)
-    sfo_location = sfo_location.dropna()
-    map_plot = px.scatter_mapbox(sfo_location,
-                                 title='Mean Sale Price (marker size) and Gross Rent (marker color) in San Francisco 2010-2016',
-                                 lat="Lat",
-                                 lon="Lon",
-                                 hover_name=sfo_location.index,
-                                 #Coordinates removed from hover data, end users unlikely to want precise lat/lon
-                                 hover_data={'Lat': False,
-                                             'Lon': False,
-                                            },
-                                 size='sale_price_sqr_foot',
-                                 size_max=15,
-                                 color='gross_rent',
-                                 color_continuous_scale='rainbow',
-                                 zoom=10
-                                )
-    return map_plot
+def map_viewport():
+    """Map center and zoom picked in the sidebar."""
+    with st.sidebar:
+        place = st.selectbox("Center map on:", ['All neighborhoods'] + list(view.locations.index))
+        zoom = st.slider("Map zoom:", min_value=8, max_value=16, value=10)
+    if place == 'All neighborhoods':
+        return None, zoom
+    return tuple(view.locations.loc[place, ['Lat', 'Lon']]), zoom
 
-def sunburst():
-    """Sunburst Plot."""
-    top_10 = sfo_data.groupby('neighborhood').mean().nlargest(10, 'sale_price_sqr_foot').reset_index()
-    top_10_full =  sfo_data[sfo_data['neighborhood'].isin(top_10.neighborhood)]
-    fig = px.sunburst(top_10_full,
-                      path=[top_10_full.index, 'neighborhood'],
-                      color='gross_rent',
-                      color_continuous_scale='blues',
-                     )
-    return fig
+def investment_metric_choice():
+    """Investment metric picked in the sidebar."""
+    with st.sidebar:
+        return st.selectbox("Investment metric:", list(investment.METRICS),
+                            format_func=lambda metric: investment.METRICS[metric][0])
 
 # Start Streamlit App
-st.header('San Francisco Rental Analysis Dashboard')
+st.header(f'{city.name} Rental Analysis Dashboard')
+
+# Views whose labels name the span of years in the data
+SUNBURST = f"Sunburst: Top Neighborhoods {plots.title_years(aggs)}"
+NEIGHBORHOOD_MAP = f"Neighborhood Map: Rent and Sale Prices {plots.title_years(aggs)}"
 
 # Sidebar with selectbox to choose which plot to show
 with st.sidebar:
@@ -220,39 +114,83 @@ with st.sidebar:
                                 "Average Gross Rent and Sale Price (together)",
                                 "Average Price by Neighborhood",
                                 "Average Rent by Neighborhood",
-                                "Top 10 Expensive Neighborhoods",
-                                "Top Expensive Neighborhoods Rent and Sales",
+                                "Top 10 Neighborhoods",
+                                "Top Neighborhoods Rent and Sales",
                                 "Parallel Coordinates",
                                 "Parallel Categories",
-                                "Sunburst: Most expensive Neighborhoods 2010-2016",
-                                "Neighborhood Map: Rent and Sale Prices 2010-2016"
+                                SUNBURST,
+                                NEIGHBORHOOD_MAP,
+                                "Top Investment Neighborhoods",
+                                "Investment Map"
                                )
                               )
-    
-if (plot_choice == 'Housing Units per Year'):
-    st.pyplot(housing_units_per_year())
+
+# Filters are answered from the aggregates' year x neighborhood cube, and the
+# selection is kept for reruns with the same filters; with the defaults the
+# full aggregates (and any warmed-up figures) are used as is
+first_year, last_year = int(aggs.cube.years.min()), int(aggs.cube.years.max())
+with st.sidebar:
+    years = st.slider("Years:", min_value=first_year, max_value=last_year, value=(first_year, last_year))
+    neighborhoods = st.multiselect("Neighborhoods (all if empty):", list(aggs.cube.neighborhoods))
+    metric = st.selectbox("Rank neighborhoods by:", list(ranking.LABELS), format_func=ranking.LABELS.get)
+filters = (years, tuple(sorted(neighborhoods)), metric)
+if filters == ((first_year, last_year), (), 'sale_price_sqr_foot'):
+    view, view_version = aggs, data_version
+else:
+    with instrumentation.span('filter'):
+        view = aggs.filtered(years, neighborhoods, metric)
+    view_version = (data_version, filters)
+
+if view.by_year_neighborhood.empty:
+    # Neighborhoods picked have no rows in the years picked
+    st.info('No data for these filters')
+elif (plot_choice == 'Housing Units per Year'):
+    show_figure(cached_figure(plots.housing_units_per_year))
 elif (plot_choice == "Average Gross Rent and Sale Price (seperate)"):
     col1, col2 = st.columns(2)
     with col1:
-        st.pyplot(average_gross_rent())
+        show_figure(cached_figure(plots.average_gross_rent))
     with col2:
-        st.pyplot(average_sales_price())
+        show_figure(cached_figure(plots.average_sales_price))
 elif (plot_choice == "Average Gross Rent and Sale Price (together)"):
-    st.pyplot(average_rent_and_price())
+    show_figure(cached_figure(plots.average_rent_and_price))
 elif (plot_choice == "Average Price by Neighborhood"):
-    st.bokeh_chart(average_price_by_neighborhood())
+    show_figure(cached_figure(plots.average_price_by_neighborhood, neighborhood=neighborhood_choice()))
 elif (plot_choice == "Average Rent by Neighborhood"):
-    st.bokeh_chart(average_rent_by_neighborhood())
-elif (plot_choice == "Top 10 Expensive Neighborhoods"):
-    st.bokeh_chart(top_most_expensive_neighborhoods())
-elif (plot_choice == "Top Expensive Neighborhoods Rent and Sales"):
-    st.bokeh_chart(most_expensive_neighborhoods_rent_sales())
+    show_figure(cached_figure(plots.average_rent_by_neighborhood, neighborhood=neighborhood_choice()))
+elif (plot_choice == "Top 10 Neighborhoods"):
+    show_figure(cached_figure(plots.top_most_expensive_neighborhoods))
+elif (plot_choice == "Top Neighborhoods Rent and Sales"):
+    show_figure(cached_figure(plots.most_expensive_neighborhoods_rent_sales))
 elif (plot_choice == "Parallel Coordinates"):
-    st.plotly_chart(parallel_coordinates())
+    show_figure(cached_figure(plots.parallel_coordinates))
 elif (plot_choice == "Parallel Categories"):
-    st.plotly_chart(parallel_categories())
-elif (plot_choice == "Sunburst: Most expensive Neighborhoods 2010-2016"):
-    st.plotly_chart(sunburst())
-elif (plot_choice == "Neighborhood Map: Rent and Sale Prices 2010-2016"):
-    st.plotly_chart(neighborhood_map())
-    
\ No newline at end of file
+    show_figure(cached_figure(plots.parallel_categories))
+elif (plot_choice == SUNBURST):
+    show_figure(cached_figure(plots.sunburst))
+elif (plot_choice == NEIGHBORHOOD_MAP):
+    center, zoom = map_viewport()
+    show_figure(cached_figure(plots.neighborhood_map, center=center, zoom=zoom))
+elif (plot_choice == "Top Investment Neighborhoods"):
+    show_figure(cached_figure(plots.top_investment_neighborhoods, metric=investment_metric_choice()))
+elif (plot_choice == "Investment Map"):
+    investment_metric = investment_metric_choice()
+    center, zoom = map_viewport()
+    show_figure(cached_figure(plots.investment_map, metric=investment_metric, center=center, zoom=zoom))
+    
+# Report how long each plotting backend took to import in this process
+with st.sidebar:
+    if backends.import_times:
+        st.caption('Backend import time: ' + ', '.join(f'{name} {seconds:.2f}s' for name, seconds in backends.import_times.items()))
+
+# Timing panel for this rerun
+report = profiler.stop() if profiler is not None else None
+spans = instrumentation.finish_run()
+if debug:
+    with st.sidebar.expander('Timing', expanded=True):
+        st.dataframe(spans)
+        st.caption(f'Data cache: {data_loader.cache_stats()}; '
+                   f'figure cache: {workspace.figures.hits} hits, {workspace.figures.misses} misses; '
+                   f'memory by city: {datasets.registry.usage()}, {datasets.registry.evictions} evicted')
+        if report:
+            st.text(report)
@@ -0,0 +1,245 @@
+"""Cached loading of the dashboard's CSV inputs.
+
+Each file is parsed once per process and the resulting DataFrame is shared by
+every Streamlit session, so callers must treat it as read-only. A file is
+re-parsed only when its content changes: a new mtime or size triggers a
+content hash, and an unchanged hash keeps the cached frame.
+
+When `python ingest.py` has written a columnar Arrow copy of a CSV next to it,
+that copy is memory-mapped instead of parsing the CSV, and only the requested
+columns are read. When it has also written the census cell store (running
+per-(year, neighborhood) sums and counts), the raw census rows are not read
+at all.
+
+For census files too large to hold in memory, set CENSUS_CHUNK_ROWS: the
+census is then streamed in chunks of that many rows, each folded into the
+cell table, and the rows are never held all at once.
+"""
+import hashlib
+import os
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+import pandas as pd
+
+import aggregates
+import instrumentation
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+CENSUS_PATH = Path("Data/sfo_neighborhoods_census_data.csv")
+COORDINATES_PATH = Path("Data/neighborhoods_coordinates.csv")
+STORE_SUFFIX = '.arrow'
+CELLS_SUFFIX = '.cells.arrow'
+
+# Rows per chunk when streaming the census; 0 reads it whole
+CHUNK_ROWS = int(os.getenv('CENSUS_CHUNK_ROWS', '0'))
+
+CENSUS_DTYPES = {'year': 'int16',
+                 'neighborhood': 'category',
+                 'sale_price_sqr_foot': 'float32',
+                 'housing_units': 'float32',
+                 'gross_rent': 'float32'
+                }
+COORDINATES_DTYPES = {'Neighborhood': 'str',
+                      'Lat': 'float64',
+                      'Lon': 'float64'
+                     }
+
+Dataset = namedtuple('Dataset', ['sfo_data', 'cells', 'neighborhood_data', 'version'])
+
+# _lock guards the dictionaries; each CSV input also has a lock of its own,
+# held while it is hashed and parsed, so a slow parse of one input never
+# blocks readers of another
+_lock = threading.Lock()
+_entries = {}
+_input_locks = {}
+_stats = {'hits': 0, 'misses': 0}
+
+
+class _Entry:
+    """A parsed file together with the file, parser, stat and digest it was parsed from."""
+
+    def __init__(self, source, stat, digest, frame):
+        # (file read, parser, columns)
+        self.source = source
+        self.stat = stat
+        self.digest = digest
+        self.frame = frame
+
+
+def _stat(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def file_digest(path):
+    """Content hash of a file, read in blocks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def store_path(csv_path):
+    """Location of the columnar store written by ingest.py for a CSV input."""
+    return Path(csv_path).with_suffix(STORE_SUFFIX)
+
+
+def cells_path(census_path):
+    """Location of the cell store written by ingest.py for a census CSV."""
+    return Path(census_path).with_suffix(CELLS_SUFFIX)
+
+
+def is_current(store, csv_path):
+    """Whether a store derived from a CSV exists, can be read and is not older than the CSV."""
+    if feather is None or not store.exists():
+        return False
+    return not os.path.exists(csv_path) or os.stat(store).st_mtime_ns >= os.stat(csv_path).st_mtime_ns
+
+
+def _source(csv_path):
+    """File to read for a CSV input: its columnar store if present and current."""
+    store = store_path(csv_path)
+    return store if is_current(store, csv_path) else Path(csv_path)
+
+
+def _read(path, dtypes, columns):
+    if path.suffix == STORE_SUFFIX:
+        # Uncompressed Arrow files are memory-mapped; numeric columns without
+        # nulls are handed to pandas without copying
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        return table.to_pandas(split_blocks=True)
+    return pd.read_csv(path, dtype=dtypes, usecols=columns)
+
+
+def _parse_census(path, columns):
+    if columns is not None:
+        columns = ['year'] + [column for column in columns if column != 'year']
+    return _read(path, CENSUS_DTYPES, columns).set_index('year')
+
+
+def read_cells(path):
+    """Cell table from a cell store, indexed by (year, neighborhood)."""
+    return feather.read_table(path, memory_map=True).to_pandas().set_index(['year', 'neighborhood'])
+
+
+def _parse_cells(path, columns):
+    return read_cells(path)
+
+
+def _chunks(path, chunk_rows):
+    columns = ['year', 'neighborhood'] + aggregates.MEASURES
+    if path.suffix == STORE_SUFFIX:
+        # Record batches of the memory-mapped file, converted one at a time
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        for batch in table.to_batches(max_chunksize=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, dtype=CENSUS_DTYPES, usecols=columns, chunksize=chunk_rows)
+
+
+def stream_cells(path, chunk_rows):
+    """Cell table of a census file read chunk_rows rows at a time.
+
+    Memory use is bounded by one chunk plus the cell table, whatever the
+    size of the file.
+    """
+    cells = None
+    for chunk in _chunks(Path(path), chunk_rows):
+        chunk_cells = aggregates.cell_table(chunk)
+        cells = chunk_cells if cells is None else aggregates.merge_cells(cells, chunk_cells)
+    return cells
+
+
+def _stream_census(path, columns):
+    return stream_cells(path, CHUNK_ROWS)
+
+
+def _parse_coordinates(path, columns):
+    neighborhood_data = _read(path, COORDINATES_DTYPES, columns)
+    return neighborhood_data.rename(columns={'Neighborhood': 'neighborhood'}).set_index('neighborhood')
+
+
+def _entry(csv_path, path, parse, columns=None):
+    """Cached entry for a CSV input read from path, re-parsed only if its content changed.
+
+    Entries are kept per CSV input, so when the input is read from another
+    file or with another parser (a store written by ingest.py, streaming
+    switched on) the new entry replaces the old frame instead of sitting
+    beside it.
+    """
+    path = Path(path)
+    if columns is not None:
+        columns = list(columns)
+    key = str(Path(csv_path).resolve())
+    source = (str(path.resolve()), parse.__name__, None if columns is None else tuple(columns))
+    with _lock:
+        input_lock = _input_locks.setdefault(key, threading.Lock())
+    with input_lock:
+        stat = _stat(path)
+        with _lock:
+            entry = _entries.get(key)
+        if entry is not None and entry.source != source:
+            entry = None
+        if entry is not None and entry.stat == stat:
+            _count('hits')
+            return entry
+        with instrumentation.span('load.hash', file=path.name):
+            digest = file_digest(path)
+        if entry is not None and entry.digest == digest:
+            # Touched but not modified
+            entry.stat = stat
+            _count('hits')
+            return entry
+        _count('misses')
+        with instrumentation.span('load.parse', file=path.name):
+            entry = _Entry(source, stat, digest, parse(path, columns))
+        with _lock:
+            _entries[key] = entry
+        return entry
+
+
+def _count(stat):
+    with _lock:
+        _stats[stat] += 1
+
+
+def load_dataset(census_path, coordinates_path, columns=None):
+    """Census and coordinates inputs plus a version of both, as (path, content hash) pairs.
+
+    With a current cell store, or when streaming with CENSUS_CHUNK_ROWS set,
+    the census comes back as its cell table in `cells` and `sfo_data` is
+    None; otherwise `sfo_data` holds the rows.
+    """
+    cells_store = cells_path(census_path)
+    if is_current(cells_store, census_path):
+        census = _entry(census_path, cells_store, _parse_cells)
+        sfo_data, cells = None, census.frame
+    elif CHUNK_ROWS > 0:
+        census = _entry(census_path, _source(census_path), _stream_census)
+        sfo_data, cells = None, census.frame
+    else:
+        census = _entry(census_path, _source(census_path), _parse_census, columns)
+        sfo_data, cells = census.frame, None
+    coordinates = _entry(coordinates_path, _source(coordinates_path), _parse_coordinates)
+    version = ((str(census_path), census.digest), (str(coordinates_path), coordinates.digest))
+    return Dataset(sfo_data, cells, coordinates.frame, version)
+
+
+def evict(*csv_paths):
+    """Drop the cached frames of these CSV inputs, whichever file they were read from."""
+    with _lock:
+        for csv_path in csv_paths:
+            _entries.pop(str(Path(csv_path).resolve()), None)
+
+
+def cache_stats():
+    """Cache hit and miss counters since the process started."""
+    with _lock:
+        return dict(_stats)
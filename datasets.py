@@ -0,0 +1,109 @@
+"""Registry of the cities the dashboard can show, and their cached data.
+
+Cities are listed in a JSON file, Data/datasets.json unless
+DASHBOARD_DATASETS names another:
+
+    {"sfo": {"name": "San Francisco",
+             "census": "Data/sfo_neighborhoods_census_data.csv",
+             "coordinates": "Data/neighborhoods_coordinates.csv"}}
+
+Without that file San Francisco is the only city. Every city opened gets
+its own loaded frames, aggregates and figure cache. When their combined
+size passes DASHBOARD_MEMORY_MB, the least recently opened cities are
+evicted and reloaded on their next use.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+
+import aggregates
+import data_loader
+import figure_cache
+import instrumentation
+
+City = namedtuple('City', ['key', 'name', 'census_path', 'coordinates_path'])
+
+REGISTRY_PATH = Path(os.getenv('DASHBOARD_DATASETS', 'Data/datasets.json'))
+DEFAULT_MAX_BYTES = int(os.getenv('DASHBOARD_MEMORY_MB', '1024')) * 2**20
+COLUMNS = ['neighborhood'] + aggregates.MEASURES
+
+
+def read_registry(path=REGISTRY_PATH):
+    """Cities of a registry file by key, in file order; San Francisco alone if there is no file."""
+    path = Path(path)
+    if not path.exists():
+        return {'sfo': City('sfo', 'San Francisco', data_loader.CENSUS_PATH, data_loader.COORDINATES_PATH)}
+    entries = json.loads(path.read_text())
+    return {key: City(key, entry['name'], Path(entry['census']), Path(entry['coordinates']))
+            for key, entry in entries.items()}
+
+
+def _frame_bytes(frame):
+    return 0 if frame is None else int(frame.memory_usage(deep=True).sum())
+
+
+class Workspace:
+    """A city's loaded dataset, its aggregates and its figure cache."""
+
+    def __init__(self, city):
+        self.city = city
+        self.dataset = None
+        self.aggs = None
+        self.data_bytes = 0
+        self.figures = figure_cache.FigureCache()
+
+    def nbytes(self):
+        return self.data_bytes + self.figures.nbytes
+
+
+class Datasets:
+    """Workspaces of the registered cities, least recently used evicted past max_bytes."""
+
+    def __init__(self, cities, max_bytes=DEFAULT_MAX_BYTES):
+        self.cities = cities
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._workspaces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def open(self, key):
+        """Workspace of a city, loaded (or refreshed if its files changed) and marked most recent."""
+        city = self.cities[key]
+        with instrumentation.span('load', city=key):
+            dataset = data_loader.load_dataset(city.census_path, city.coordinates_path, columns=COLUMNS)
+        with instrumentation.span('aggregate', city=key):
+            aggs = aggregates.get_aggregates(dataset, city.name)
+        with self._lock:
+            workspace = self._workspaces.pop(key, None) or Workspace(city)
+            if workspace.dataset is None or workspace.dataset.version != dataset.version:
+                # Figures of the previous version can no longer be shown
+                workspace.figures.clear()
+                workspace.data_bytes = sum(_frame_bytes(frame) for frame in dataset[:3]) + aggs.memory_usage()
+            workspace.dataset, workspace.aggs = dataset, aggs
+            self._workspaces[key] = workspace
+            self._evict(keep=key)
+        return workspace
+
+    def _evict(self, keep):
+        total = sum(workspace.nbytes() for workspace in self._workspaces.values())
+        for key in list(self._workspaces):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            workspace = self._workspaces.pop(key)
+            total -= workspace.nbytes()
+            data_loader.evict(workspace.city.census_path, workspace.city.coordinates_path)
+            aggregates.evict(workspace.dataset)
+            workspace.figures.clear()
+            self.evictions += 1
+
+    def usage(self):
+        """Bytes held per open city, least recently used first."""
+        with self._lock:
+            return {key: workspace.nbytes() for key, workspace in self._workspaces.items()}
+
+
+registry = Datasets(read_registry())
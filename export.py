@@ -0,0 +1,176 @@
+"""Render every dashboard view to static files, without a Streamlit server.
+
+    python export.py [--city KEY] [--output Output/Plots] [--workers N] [--force]
+
+The data is loaded and aggregated once, then the views are rendered in
+parallel in a process pool: matplotlib views are written as PNG, Plotly and
+Bokeh views as self-contained HTML pages with plotly.js or BokehJS inline. A manifest.json in the output folder
+records a hash of each file's inputs (data version, view parameters, the
+local modules used to render and the plotting library versions), and views whose inputs have not changed since the last
+export are skipped. Cities other than the first in the dataset registry are
+exported to a folder of their own under Output/Plots.
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import importlib.metadata
+import json
+import os
+import sys
+from pathlib import Path
+
+import aggregates
+import data_loader
+import datasets
+import figure_cache
+# Imported lazily by figure_cache; imported here so code_digest covers it
+import plotly_payload
+import plots
+
+OUTPUT_PATH = Path('Output/Plots')
+MANIFEST = 'manifest.json'
+
+# Libraries whose versions change the rendered files
+LIBRARIES = ['matplotlib', 'plotly', 'bokeh', 'holoviews', 'hvplot']
+
+# File names of the views, matching the plots first exported from the notebook
+FILE_NAMES = {'housing_units_per_year': 'yearly_avg_units',
+              'average_gross_rent': 'rent_plot',
+              'average_sales_price': 'price_plot',
+              'average_rent_and_price': 'price_and_rent_plot',
+              'average_price_by_neighborhood': 'average_price_by_neighborhood',
+              'average_rent_by_neighborhood': 'average_rent_by_neighborhood',
+              'top_most_expensive_neighborhoods': 'top_10_neighborhoods',
+              'most_expensive_neighborhoods_rent_sales': 'top_10_sale_and_rent',
+              'parallel_coordinates': 'parallel_coordinates',
+              'parallel_categories': 'parallel_categories',
+              'neighborhood_map': 'map_plot',
+              'sunburst': 'sunburst',
+              'top_investment_neighborhoods': 'top_10_investment',
+              'investment_map': 'investment_map_plot'
+             }
+
+PAGE_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+</head>
+<body>
+{body}
+</body>
+</html>
+"""
+
+_aggs = None
+
+
+def _init_worker(aggs):
+    global _aggs
+    _aggs = aggs
+
+
+def _render(name, params):
+    """Render one view in a worker process from the aggregates it was started with."""
+    return figure_cache.serialize(getattr(plots, name)(_aggs, **params))
+
+
+def code_digest():
+    """Digest of the local modules loaded in this process and of the plotting library versions."""
+    root = Path(__file__).resolve().parent
+    files = sorted({Path(module.__file__).resolve() for module in list(sys.modules.values())
+                    if getattr(module, '__file__', None) and Path(module.__file__).resolve().parent == root})
+    versions = []
+    for library in LIBRARIES:
+        try:
+            versions.append(importlib.metadata.version(library))
+        except importlib.metadata.PackageNotFoundError:
+            versions.append(None)
+    text = json.dumps([[file.name, data_loader.file_digest(file)] for file in files] + versions)
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def input_hash(version, name, params, code_digest):
+    """Digest of everything a view's output depends on."""
+    text = json.dumps([[digest for _, digest in version], name, sorted(params.items()), code_digest], default=str)
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def write_figure(entry, path):
+    """Write a CachedFigure as PNG bytes or a self-contained HTML page; returns the file written.
+
+    A file of the view in the other format, left from when it was drawn
+    with another library, is removed.
+    """
+    if entry.kind == 'png':
+        path, stale = path.with_suffix('.png'), path.with_suffix('.html')
+        path.write_bytes(entry.payload)
+    else:
+        path, stale = path.with_suffix('.html'), path.with_suffix('.png')
+        body = figure_cache.embed_html(entry, resources='inline')
+        path.write_text(PAGE_HTML.format(title=path.stem, body=body), encoding='utf-8')
+    stale.unlink(missing_ok=True)
+    return path
+
+
+def export(output=OUTPUT_PATH, workers=None, force=False,
+           census_path=data_loader.CENSUS_PATH, coordinates_path=data_loader.COORDINATES_PATH, place=None):
+    """Render the views whose inputs changed; returns (written, skipped) file names."""
+    output = Path(output)
+    output.mkdir(parents=True, exist_ok=True)
+    manifest_path = output / MANIFEST
+    manifest = {} if force or not manifest_path.exists() else json.loads(manifest_path.read_text())
+
+    dataset = data_loader.load_dataset(census_path, coordinates_path, columns=['neighborhood'] + aggregates.MEASURES)
+    aggs = aggregates.get_aggregates(dataset, place)
+    # Every local module a view's output can depend on is imported by now
+    code = code_digest()
+
+    todo, skipped = {}, []
+    for name, params in plots.default_views(aggs):
+        digest = input_hash(dataset.version, name, dict(params, place=place), code)
+        previous = manifest.get(FILE_NAMES[name])
+        if previous and previous['inputs'] == digest and (output / previous['file']).exists():
+            skipped.append(previous['file'])
+        else:
+            todo[name] = (params, digest)
+
+    written = []
+    if todo:
+        with concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(aggs,)) as pool:
+            futures = {pool.submit(_render, name, params): name for name, (params, _) in todo.items()}
+            for future in concurrent.futures.as_completed(futures):
+                name = futures[future]
+                path = write_figure(future.result(), output / FILE_NAMES[name])
+                manifest[FILE_NAMES[name]] = {'file': path.name, 'inputs': todo[name][1]}
+                written.append(path.name)
+        # Written last, so an interrupted export re-renders what it did not record
+        partial = manifest_path.with_name(manifest_path.name + '.partial')
+        partial.write_text(json.dumps(manifest, indent=2, sort_keys=True) + '\n')
+        os.replace(partial, manifest_path)
+    return sorted(written), sorted(skipped)
+
+
+def main(argv=None):
+    cities = datasets.read_registry()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--city', choices=list(cities), default=next(iter(cities)))
+    parser.add_argument('--output', help='folder for the exported files')
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--force', action='store_true', help='render every view even if unchanged')
+    args = parser.parse_args(argv)
+
+    city = cities[args.city]
+    output = args.output
+    if output is None:
+        output = OUTPUT_PATH if args.city == next(iter(cities)) else OUTPUT_PATH / args.city
+    written, skipped = export(output, args.workers, args.force,
+                              city.census_path, city.coordinates_path, city.name)
+    for name in written:
+        sys.stdout.write(f'wrote {name}\n')
+    if skipped:
+        sys.stdout.write(f'{len(skipped)} unchanged\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""Cache of rendered dashboard figures, shared across sessions.
+
+Figures are stored serialized (PNG bytes for matplotlib, JSON for Plotly and
+Bokeh) so a repeat view is served without touching pandas or any plotting
+library. Entries are evicted least recently used first once the cache grows
+past its memory cap.
+"""
+import functools
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import instrumentation
+import mpl_figures
+
+CachedFigure = namedtuple('CachedFigure', ['kind', 'payload', 'version', 'height'])
+
+DEFAULT_MAX_BYTES = int(os.getenv('FIGURE_CACHE_MB', '256')) * 2**20
+
+# Where the pages drawing Plotly and Bokeh figures get the JavaScript
+# libraries: 'inline' embeds them in each page, which then works offline or
+# behind a proxy like Streamlit's own charts; 'cdn' loads them from
+# cdn.plot.ly and cdn.bokeh.org, for much smaller pages
+JS_RESOURCES = os.getenv('FIGURE_JS_RESOURCES', 'inline')
+
+PLOTLY_CDN = '<script src="https://cdn.plot.ly/plotly-{version}.min.js"></script>'
+BOKEH_CDN = """<script src="https://cdn.bokeh.org/bokeh/release/bokeh-{version}.min.js"></script>
+<script src="https://cdn.bokeh.org/bokeh/release/bokeh-widgets-{version}.min.js"></script>"""
+
+# Plotly and Bokeh figures are embedded as their JSON with the matching
+# JavaScript library, without re-running any plotting code
+PLOTLY_HTML = """{library}
+<div id="figure"></div>
+<script>
+const figure = {payload};
+Plotly.newPlot('figure', figure.data, figure.layout, {{responsive: true}});
+</script>"""
+
+BOKEH_HTML = """{library}
+<div id="figure"></div>
+<script>
+Bokeh.embed.embed_item({payload}, 'figure');
+</script>"""
+
+
+def figure_key(name, params, version):
+    """Cache key for a plot rendered with the given parameters from a data version."""
+    return (name, tuple(sorted(params.items())), version)
+
+
+def _bokeh_height(model):
+    """Best-effort pixel height of a Bokeh layout, for sizing its iframe."""
+    children = getattr(model, 'children', None)
+    if children:
+        heights = [_bokeh_height(getattr(child, 'child', child)) for child in children]
+        return sum(heights) if type(model).__name__ == 'Column' else max(heights)
+    return (getattr(model, 'height', None) or 300) + 20
+
+
+def serialize(fig):
+    """Serialize a matplotlib, Plotly or Bokeh figure into a CachedFigure."""
+    if hasattr(fig, 'savefig'):
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', bbox_inches='tight')
+        mpl_figures.release(fig)
+        return CachedFigure('png', buffer.getvalue(), None, None)
+    if hasattr(fig, 'to_plotly_json'):
+        from plotly.offline import get_plotlyjs_version
+        import plotly_payload
+        version = get_plotlyjs_version()
+        height = (fig.layout.height or 450) + 20
+        return CachedFigure('plotly', plotly_payload.to_json(fig, version).encode(), version, height)
+    import bokeh
+    from bokeh.embed import json_item
+    payload = json.dumps(json_item(fig)).encode()
+    return CachedFigure('bokeh', payload, bokeh.__version__, _bokeh_height(fig))
+
+
+@functools.lru_cache(maxsize=None)
+def library_html(kind, version, resources):
+    """Script tags loading plotly.js or BokehJS of a version, inline or from the CDN."""
+    if resources == 'cdn':
+        return (PLOTLY_CDN if kind == 'plotly' else BOKEH_CDN).format(version=version)
+    # Inline libraries come from the installed packages, the versions the
+    # cached figures were serialized with
+    if kind == 'plotly':
+        from plotly.offline import get_plotlyjs
+        return f'<script type="text/javascript">{get_plotlyjs()}</script>'
+    from bokeh.resources import Resources
+    return Resources(mode='inline', components=['bokeh', 'bokeh-widgets']).render_js()
+
+
+def embed_html(entry, resources=None):
+    """HTML that draws a cached Plotly or Bokeh figure; resources defaults to JS_RESOURCES."""
+    template = PLOTLY_HTML if entry.kind == 'plotly' else BOKEH_HTML
+    payload = entry.payload.decode().replace('</', '<\\/')
+    library = library_html(entry.kind, entry.version, resources or JS_RESOURCES)
+    return template.format(library=library, payload=payload)
+
+
+class FigureCache:
+    """Thread-safe LRU cache of CachedFigure entries, capped by payload size."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        size = len(entry.payload)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= len(old.payload)
+            self._entries[key] = entry
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= len(evicted.payload)
+
+    def get_or_render(self, key, render):
+        """Cached figure for key, calling render() and serializing it on a miss."""
+        entry = self.get(key)
+        if entry is None:
+            # Rendered outside the lock so slow figures don't block other views
+            fig = render()
+            start = time.perf_counter()
+            entry = serialize(fig)
+            instrumentation.record('figure.serialize', time.perf_counter() - start, kind=entry.kind)
+            self.put(key, entry)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
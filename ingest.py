@@ -0,0 +1,124 @@
+"""Convert the dashboard's CSV inputs into columnar Arrow files.
+
+    python ingest.py [--census CSV] [--coordinates CSV]
+    python ingest.py [--census CSV] --append DELTA_CSV
+
+Each CSV is parsed once with the dtypes data_loader uses and written as an
+uncompressed Arrow (Feather v2) file next to it, which data_loader then
+memory-maps in preference to the CSV. The census also gets a cell store of
+per-(year, neighborhood) sums and counts that the aggregates derive from.
+
+--append adds the rows of a delta CSV to the census and folds them into the
+cell store, so the update costs time proportional to the delta rather than
+the whole history.
+
+Neighborhood names are matched between the census and the coordinates after
+trimming whitespace; names that needed trimming, or that are found in only
+one of the two files, are reported.
+"""
+import argparse
+import os
+
+import pandas as pd
+import pyarrow.feather as feather
+
+import aggregates
+import data_loader
+import neighborhoods
+
+
+def _write(frame, store):
+    # Write beside the target and swap it in, so running dashboards never
+    # map a half-written file
+    partial = store.with_name(store.name + '.partial')
+    feather.write_feather(frame, partial, compression='uncompressed')
+    os.replace(partial, store)
+    return store
+
+
+def ingest(csv_path, dtypes):
+    """Write the columnar store for one CSV and return its path."""
+    frame = pd.read_csv(csv_path, dtype=dtypes)
+    return _write(frame, data_loader.store_path(csv_path))
+
+
+def write_cells(census_path, cells):
+    """Write the cell store for a census CSV and return its path."""
+    frame = cells.reset_index()
+    frame['neighborhood'] = frame['neighborhood'].astype('category')
+    return _write(frame, data_loader.cells_path(census_path))
+
+
+def build_cells(census_path):
+    """Cell table computed from every row of a census CSV, streamed if CENSUS_CHUNK_ROWS is set."""
+    if data_loader.CHUNK_ROWS > 0:
+        return data_loader.stream_cells(census_path, data_loader.CHUNK_ROWS)
+    sfo_data = pd.read_csv(census_path, dtype=data_loader.CENSUS_DTYPES, index_col='year')
+    return aggregates.cell_table(sfo_data)
+
+
+def append(census_path, delta_path):
+    """Add the rows of a delta CSV to the census and its cell store."""
+    delta = pd.read_csv(delta_path, dtype=data_loader.CENSUS_DTYPES)
+    # The CSV gets the delta's values as written; the compact dtypes above
+    # would round them, so they only feed the cell table
+    rows = pd.read_csv(delta_path, dtype=str, keep_default_na=False)
+    store = data_loader.cells_path(census_path)
+    if data_loader.is_current(store, census_path):
+        cells = data_loader.read_cells(store)
+    else:
+        # First append, or the census was edited by hand: rebuild once
+        cells = build_cells(census_path)
+    cells = aggregates.merge_cells(cells, aggregates.cell_table(delta.set_index('year')))
+
+    # Keep the raw census complete; the cell store is written afterwards so
+    # it is never older than the CSV it summarizes
+    columns = pd.read_csv(census_path, nrows=0).columns
+    with open(census_path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell():
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                f.write(b'\n')
+    rows[columns].to_csv(census_path, mode='a', header=False, index=False)
+    return write_cells(census_path, cells)
+
+
+def report_mismatches(census_path, coordinates_path):
+    """Print neighborhood names that differ between the census and the coordinates."""
+    census = pd.read_csv(census_path, usecols=['neighborhood'], dtype='category')['neighborhood']
+    coordinates = pd.read_csv(coordinates_path, usecols=['Neighborhood'], dtype='str')['Neighborhood']
+    found = neighborhoods.mismatches(census.cat.categories, coordinates)
+    for name in found.renamed:
+        print(f"warning: neighborhood {name!r} matched as {neighborhoods.normalize([name])[0]!r}")
+    for name in found.census_only:
+        print(f"warning: neighborhood {name!r} has no coordinates and is left off the map")
+    for name in found.coordinates_only:
+        print(f"warning: neighborhood {name!r} has coordinates but no census data")
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--census', default=data_loader.CENSUS_PATH)
+    parser.add_argument('--coordinates', default=data_loader.COORDINATES_PATH)
+    parser.add_argument('--append', metavar='DELTA_CSV')
+    args = parser.parse_args(argv)
+
+    if args.append:
+        store = append(args.census, args.append)
+        print(f"{args.append} -> {args.census}, {store}")
+        report_mismatches(args.census, args.coordinates)
+        return
+
+    for csv_path, dtypes in ((args.census, data_loader.CENSUS_DTYPES),
+                             (args.coordinates, data_loader.COORDINATES_DTYPES)):
+        store = ingest(csv_path, dtypes)
+        print(f"{csv_path} -> {store}")
+    store = write_cells(args.census, build_cells(args.census))
+    print(f"{args.census} -> {store}")
+    report_mismatches(args.census, args.coordinates)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""Timing spans for the dashboard's hot paths.
+
+Spans are collected per rerun (Streamlit runs each session's script in its
+own thread) for the debug sidebar and a JSON line on the `dashboard.timing`
+logger, and summed per process for a Prometheus-style text endpoint.
+
+    DASHBOARD_TIMING_LOG=1     log every rerun's spans to stderr
+    DASHBOARD_METRICS_PORT=N   serve /metrics on port N
+"""
+import contextlib
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger('dashboard.timing')
+if os.getenv('DASHBOARD_TIMING_LOG') == '1':
+    logger.addHandler(logging.StreamHandler())
+    logger.setLevel(logging.INFO)
+
+_local = threading.local()
+_lock = threading.Lock()
+_totals = {}
+_server = None
+
+
+def record(name, seconds, **labels):
+    """Add a finished span to the current rerun and the process totals."""
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        total = _totals.setdefault(key, [0, 0.0])
+        total[0] += 1
+        total[1] += seconds
+    spans = getattr(_local, 'spans', None)
+    if spans is not None:
+        spans.append({'span': name, **labels, 'seconds': seconds})
+
+
+@contextlib.contextmanager
+def span(name, **labels):
+    """Time the enclosed block as a span."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start, **labels)
+
+
+def start_run():
+    """Start collecting spans for a rerun in this thread."""
+    _local.spans = []
+
+
+def finish_run():
+    """Spans collected since start_run, also written to the timing log."""
+    spans = getattr(_local, 'spans', None) or []
+    _local.spans = None
+    logger.info(json.dumps({'event': 'rerun', 'spans': spans}))
+    return spans
+
+
+def _label_text(name, labels):
+    pairs = [('span', name)] + list(labels)
+    return ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                    for key, value in pairs)
+
+
+def prometheus_text():
+    """Process-wide span totals in the Prometheus text exposition format."""
+    with _lock:
+        totals = sorted(_totals.items())
+    seconds = ['# HELP dashboard_span_seconds_total Time spent in each span.',
+               '# TYPE dashboard_span_seconds_total counter']
+    counts = ['# HELP dashboard_span_count_total Number of times each span ran.',
+              '# TYPE dashboard_span_count_total counter']
+    for (name, labels), (count, total) in totals:
+        label_text = _label_text(name, labels)
+        seconds.append(f'dashboard_span_seconds_total{{{label_text}}} {total}')
+        counts.append(f'dashboard_span_count_total{{{label_text}}} {count}')
+    return '\n'.join(seconds + counts) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port):
+    """Serve /metrics from a background thread; later calls reuse the server."""
+    global _server
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(('', port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+        return _server
+
+
+class RunProfiler:
+    """Profile of a single rerun, with pyinstrument when installed, else cProfile."""
+
+    def __init__(self):
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            Profiler = None
+        self._pyinstrument = Profiler() if Profiler is not None else None
+        self._cprofile = None if Profiler is not None else cProfile.Profile()
+
+    def start(self):
+        if self._pyinstrument is not None:
+            self._pyinstrument.start()
+        else:
+            self._cprofile.enable()
+
+    def stop(self):
+        """Stop profiling and return a text report."""
+        if self._pyinstrument is not None:
+            self._pyinstrument.stop()
+            return self._pyinstrument.output_text()
+        self._cprofile.disable()
+        report = io.StringIO()
+        pstats.Stats(self._cprofile, stream=report).sort_stats('cumulative').print_stats(30)
+        return report.getvalue()
@@ -0,0 +1,91 @@
+"""Derived investment metrics per neighborhood, from the aggregates' cube.
+
+All metrics are computed with array operations over the (year x
+neighborhood) means of sale price and gross rent, once per data version
+(or per filter selection), so the dashboard never recomputes them per view.
+
+Sale prices are per square foot while rents are per unit, so price-to-rent
+and yield assume a rented unit of UNIT_SQFT square feet.
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+UNIT_SQFT = 1000
+
+# Metric name -> (label, whether higher values rank first)
+METRICS = {'gross_yield': ('Gross rental yield', True),
+           'price_to_rent': ('Price to annual rent ratio', False),
+           'price_cagr': ('Sale price growth per year (CAGR)', True),
+           'rent_cagr': ('Gross rent growth per year (CAGR)', True),
+           'price_volatility': ('Sale price volatility', False),
+           'rent_volatility': ('Gross rent volatility', False)
+          }
+
+Metrics = namedtuple('Metrics', ['by_neighborhood', 'by_year_neighborhood'])
+
+
+def year_over_year(years, means):
+    """Growth of each (year, neighborhood) mean over the previous year with data in the table.
+
+    Growth across a gap of several years is annualized; the first year is NaN.
+    """
+    gaps = np.diff(years).astype('float64')[:, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        growth = (means[1:] / means[:-1]) ** (1 / gaps) - 1
+    return np.concatenate([np.full((1, means.shape[1]), np.nan), growth])
+
+
+def cagr(years, means):
+    """Compound annual growth per neighborhood between its first and last year with data."""
+    if len(years) == 0:
+        return np.full(means.shape[1], np.nan)
+    valid = ~np.isnan(means)
+    first = valid.argmax(axis=0)
+    last = len(years) - 1 - valid[::-1].argmax(axis=0)
+    columns = np.arange(means.shape[1])
+    span = (years[last] - years[first]).astype('float64')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        growth = (means[last, columns] / means[first, columns]) ** (1 / span) - 1
+    # A single year of data has no growth
+    return np.where(span > 0, growth, np.nan)
+
+
+def volatility(growth):
+    """Sample standard deviation of each neighborhood's year-over-year growth."""
+    valid = ~np.isnan(growth)
+    count = valid.sum(axis=0)
+    values = np.where(valid, growth, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = values.sum(axis=0) / count
+        squares = np.where(valid, (growth - mean) ** 2, 0.0).sum(axis=0)
+        return np.where(count >= 2, np.sqrt(squares / (count - 1)), np.nan)
+
+
+def compute(years, names, sums, counts, measures):
+    """Metrics tables for a (year, neighborhood, measure) block of sums and counts."""
+    price, rent = measures.index('sale_price_sqr_foot'), measures.index('gross_rent')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+        period = sums.sum(axis=0) / counts.sum(axis=0)
+        price_to_rent = period[:, price] * UNIT_SQFT / (12 * period[:, rent])
+        gross_yield = 12 * period[:, rent] / (period[:, price] * UNIT_SQFT)
+    price_growth = year_over_year(years, means[:, :, price])
+    rent_growth = year_over_year(years, means[:, :, rent])
+
+    by_neighborhood = pd.DataFrame({'gross_yield': gross_yield,
+                                    'price_to_rent': price_to_rent,
+                                    'price_cagr': cagr(years, means[:, :, price]),
+                                    'rent_cagr': cagr(years, means[:, :, rent]),
+                                    'price_volatility': volatility(price_growth),
+                                    'rent_volatility': volatility(rent_growth)
+                                   },
+                                   index=pd.Index(names, name='neighborhood'))
+    cell_years, cell_names = np.nonzero(counts.sum(axis=2) > 0)
+    by_year_neighborhood = pd.DataFrame({'price_growth': price_growth[cell_years, cell_names],
+                                         'rent_growth': rent_growth[cell_years, cell_names]
+                                        },
+                                        index=pd.MultiIndex.from_arrays([years[cell_years], names[cell_names]],
+                                                                        names=['year', 'neighborhood']))
+    return Metrics(by_neighborhood, by_year_neighborhood)
@@ -0,0 +1,37 @@
+"""Managed matplotlib figures for the pyplot views.
+
+Figures are created object-oriented on an Agg canvas, so they never enter
+pyplot's global figure registry and are freed as soon as they are released.
+With FIGURE_POOL_SIZE set above zero, released figures are cleared and kept
+for reuse instead of being rebuilt on the next render.
+"""
+import os
+import threading
+
+import backends
+
+POOL_SIZE = int(os.getenv('FIGURE_POOL_SIZE', '0'))
+
+_lock = threading.Lock()
+_pool = []
+
+
+def acquire():
+    """An empty figure on an Agg canvas, from the pool when one is available."""
+    with _lock:
+        if _pool:
+            return _pool.pop()
+    Figure, FigureCanvasAgg = backends.matplotlib()
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def release(fig):
+    """Dispose of a figure once it has been rendered."""
+    # Clearing drops the axes, artists and their data even if something
+    # still holds a reference to the figure
+    fig.clear()
+    with _lock:
+        if len(_pool) < POOL_SIZE:
+            _pool.append(fig)
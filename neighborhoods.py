@@ -0,0 +1,78 @@
+"""Shared dictionary of neighborhood names and their integer codes.
+
+Both inputs spell neighborhoods as free text, and a few census names carry
+stray whitespace that kept them from joining to their coordinates. Names are
+normalized once per distinct value and given dense integer codes in sorted
+order, so grouping and joins work on integer arrays instead of hashing and
+comparing strings row by row.
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+Mismatches = namedtuple('Mismatches', ['renamed', 'census_only', 'coordinates_only'])
+
+
+def normalize(names):
+    """Names with surrounding whitespace removed and inner whitespace collapsed."""
+    names = pd.Index(names, dtype=object)
+    return np.asarray(names.str.strip().str.replace(r'\s+', ' ', regex=True), dtype=object)
+
+
+class Dictionary:
+    """Sorted normalized neighborhood names; a name's code is its position."""
+
+    def __init__(self, names):
+        self.names = np.unique(normalize(pd.Index(names).unique().dropna()))
+
+    @classmethod
+    def encode(cls, values):
+        """(dictionary of the values' names, code of each value), normalizing each name once."""
+        values = pd.Index(values)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            inverse, uniques = np.asarray(values.codes), values.categories
+        else:
+            inverse, uniques = pd.factorize(values)
+        dictionary = cls([])
+        dictionary.names, unique_codes = np.unique(normalize(uniques), return_inverse=True)
+        if len(unique_codes) == 0:
+            return dictionary, np.full(len(values), -1)
+        return dictionary, np.where(inverse >= 0, unique_codes[inverse], -1)
+
+    def __len__(self):
+        return len(self.names)
+
+    def codes(self, values):
+        """Code of each value, -1 where its normalized name is not in the dictionary.
+
+        Each distinct value is normalized and looked up once; categorical
+        values are mapped through their categories without touching the rows.
+        """
+        values = pd.Index(values)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            category_codes = self.codes(values.categories)
+            row_codes = np.asarray(values.codes)
+            return np.where(row_codes >= 0, category_codes[row_codes], -1)
+        inverse, uniques = pd.factorize(values)
+        if len(self.names) == 0 or len(uniques) == 0:
+            return np.full(len(values), -1)
+        normalized = normalize(uniques)
+        positions = np.searchsorted(self.names, normalized).clip(max=len(self.names) - 1)
+        unique_codes = np.where(self.names[positions] == normalized, positions, -1)
+        return np.where(inverse >= 0, unique_codes[inverse], -1)
+
+    def level_codes(self, index, level):
+        """Codes of one level of a MultiIndex, looking up each level value once."""
+        position = index.names.index(level)
+        return self.codes(index.levels[position])[index.codes[position]]
+
+
+def mismatches(census_names, coordinate_names):
+    """Names changed by normalization, and normalized names found in only one input."""
+    census = pd.Index(census_names).unique().dropna()
+    coordinates = pd.Index(coordinate_names).unique().dropna()
+    raw = census.append(coordinates).unique()
+    renamed = sorted(name for name, clean in zip(raw, normalize(raw)) if name != clean)
+    census, coordinates = set(normalize(census)), set(normalize(coordinates))
+    return Mismatches(renamed, sorted(census - coordinates), sorted(coordinates - census))
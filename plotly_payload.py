@@ -0,0 +1,109 @@
+"""Compact JSON encoding of Plotly figures for the browser.
+
+Plotly Express keeps every hover_data column in a trace's customdata, even
+columns hidden from the hover text, and encodes numeric arrays as full
+precision float64 JSON text. Before a figure is cached its unused customdata
+columns are dropped, and numeric arrays are sent as base64 typed arrays
+(float32 for floats, the smallest integer type that fits for integers),
+which plotly.js decodes natively from version 2.28. With an older plotly.js,
+floats are rounded to SIGNIFICANT_DIGITS in the JSON text instead.
+"""
+import base64
+import re
+
+import numpy as np
+from plotly.io.json import to_json_plotly
+
+SIGNIFICANT_DIGITS = 7
+
+# Shorter arrays are left as JSON text, where they are about as small; this
+# also keeps two-element settings such as domain ranges as plain lists
+MIN_TYPED_LENGTH = 16
+
+TYPED_ARRAYS_SINCE = (2, 28)
+
+INTEGER_TYPES = ['u1', 'i1', 'u2', 'i2', 'u4', 'i4']
+
+_CUSTOMDATA_INDEX = re.compile(r'customdata\[(\d+)\]')
+_CUSTOMDATA_WHOLE = re.compile(r'customdata(?!\[)')
+_TEMPLATES = ('hovertemplate', 'texttemplate')
+
+
+def supports_typed_arrays(plotlyjs_version):
+    """Whether a plotly.js version decodes base64 typed arrays."""
+    return tuple(int(part) for part in plotlyjs_version.split('.')[:2]) >= TYPED_ARRAYS_SINCE
+
+
+def _numeric(values):
+    """values as a 1-d numeric array, or None if they are anything else."""
+    if isinstance(values, np.ndarray):
+        array = values
+    elif values and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+        array = np.asarray(values)
+    else:
+        return None
+    return array if array.ndim == 1 and array.dtype.kind in 'fiu' else None
+
+
+def _typed(array):
+    if array.dtype.kind == 'f':
+        return {'dtype': 'f4', 'bdata': base64.b64encode(array.astype('<f4').tobytes()).decode()}
+    low, high = (array.min(), array.max()) if len(array) else (0, 0)
+    for dtype in INTEGER_TYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return {'dtype': dtype, 'bdata': base64.b64encode(array.astype('<' + dtype).tobytes()).decode()}
+    return {'dtype': 'f8', 'bdata': base64.b64encode(array.astype('<f8').tobytes()).decode()}
+
+
+def _rounded(array):
+    if array.dtype.kind != 'f':
+        return array.tolist()
+    return [float(f'{value:.{SIGNIFICANT_DIGITS}g}') for value in array.tolist()]
+
+
+def _compact(node, typed):
+    if isinstance(node, dict):
+        return {key: _compact(value, typed) for key, value in node.items()}
+    if isinstance(node, (list, tuple, np.ndarray)):
+        array = _numeric(node)
+        if array is not None:
+            return _typed(array) if typed and len(array) >= MIN_TYPED_LENGTH else _rounded(array)
+        items = node.tolist() if isinstance(node, np.ndarray) else node
+        return [_compact(item, typed) for item in items]
+    return node
+
+
+def strip_customdata(trace):
+    """Trace without the customdata columns its hover and text templates never show."""
+    if 'customdata' not in trace:
+        return trace
+    templates = ' '.join(str(trace.get(name) or '') for name in _TEMPLATES)
+    if _CUSTOMDATA_WHOLE.search(templates):
+        return trace
+    trace = dict(trace)
+    used = sorted({int(index) for index in _CUSTOMDATA_INDEX.findall(templates)})
+    if not used:
+        del trace['customdata']
+        return trace
+    customdata = np.asarray(trace['customdata'], dtype=object)
+    if customdata.ndim != 2:
+        return trace
+    trace['customdata'] = customdata[:, used]
+    for name in _TEMPLATES:
+        if trace.get(name):
+            trace[name] = _CUSTOMDATA_INDEX.sub(lambda match: f'customdata[{used.index(int(match.group(1)))}]',
+                                                trace[name])
+    return trace
+
+
+def to_json(fig, plotlyjs_version):
+    """Compact JSON text of a Plotly figure for the given plotly.js version."""
+    figure = fig.to_plotly_json()
+    typed = supports_typed_arrays(plotlyjs_version)
+    data = []
+    for trace in figure['data']:
+        trace = strip_customdata(trace)
+        trace.pop('uid', None)
+        data.append(_compact(trace, typed))
+    return to_json_plotly({'data': data, 'layout': figure['layout']})
@@ -0,0 +1,328 @@
+"""Plot functions for the dashboard views.
+
+Every function takes the Aggregates of a dataset as its first argument and
+returns a matplotlib, Bokeh or Plotly figure, so the views can be built
+without running the Streamlit app.
+"""
+import backends
+import downsample
+import instrumentation
+import investment
+import mpl_figures
+import ranking
+import spatial
+
+# Per-neighborhood line views send at most this many points per series
+MAX_LINE_POINTS = 500
+
+# Above this many points in the viewport the map draws clusters instead
+MAX_MAP_POINTS = 2000
+
+def default_views(aggs):
+    """(plot function name, parameters) of every view as the dashboard first shows it."""
+    neighborhood = aggs.by_neighborhood.index[0]
+    return [('housing_units_per_year', {}),
+            ('average_gross_rent', {}),
+            ('average_sales_price', {}),
+            ('average_rent_and_price', {}),
+            ('average_price_by_neighborhood', {'neighborhood': neighborhood}),
+            ('average_rent_by_neighborhood', {'neighborhood': neighborhood}),
+            ('top_most_expensive_neighborhoods', {}),
+            ('most_expensive_neighborhoods_rent_sales', {}),
+            ('parallel_coordinates', {}),
+            ('parallel_categories', {}),
+            ('neighborhood_map', {'center': None, 'zoom': 10}),
+            ('sunburst', {}),
+            ('top_investment_neighborhoods', {'metric': 'gross_yield'}),
+            ('investment_map', {'metric': 'gross_yield', 'center': None, 'zoom': 10})
+           ]
+
+def title_city(aggs):
+    """City name and a space for plot titles, or nothing for an unnamed dataset."""
+    return f'{aggs.place} ' if aggs.place else ''
+
+def title_years(aggs):
+    """Span of years in the data for plot titles, like 2010-2016."""
+    first, last = aggs.by_year.index.min(), aggs.by_year.index.max()
+    return f'{first}-{last}' if first != last else f'{first}'
+
+def title_top(aggs):
+    """Which neighborhoods the top-N views show, following the metric they are ranked by."""
+    if aggs.top_metric == 'sale_price_sqr_foot':
+        return f'Top {aggs.top_n} Most Expensive {title_city(aggs)}Neighborhoods'
+    return f'Top {aggs.top_n} {title_city(aggs)}Neighborhoods by {ranking.LABELS[aggs.top_metric]}'
+
+def render_bokeh(hv, fig):
+    """Bokeh model for a HoloViews object."""
+    with instrumentation.span('hv.render'):
+        return hv.render(fig)
+
+def housing_units_per_year(aggs):
+    """Housing Units Per Year."""
+    yearly_avg_units = aggs.by_year['housing_units']
+    # Filtered years without data are NaN; limits come from the years with data
+    min = yearly_avg_units.min()
+    max = yearly_avg_units.max()
+    std = yearly_avg_units.std()
+    if not std > 0:
+        # A single year (or identical years) has no spread to pad the bars with
+        std = 0.05 * abs(max) or 1
+    ylim = [min-std, max+std] if yearly_avg_units.notna().any() else None
+    fig = mpl_figures.acquire()
+    yearly_avg_units.plot(kind='bar', 
+                          ax=fig.add_subplot(),
+                          xlabel='Year', 
+                          ylim=ylim,
+                          title=f'Housing Units in {title_city(aggs)}{title_years(aggs)}'
+                         )
+    return fig
+
+def average_gross_rent(aggs):
+    """Average Gross Rent Per Year."""
+    rent_plot = aggs.by_year['gross_rent']
+    fig = mpl_figures.acquire()
+    rent_plot.plot(ax=fig.add_subplot(),
+                   ylabel='Gross Rent',
+                   xlabel='Year',
+                   marker='o', 
+                   title='Average Gross Rent by Year', 
+                   color='red'
+                  )
+    return fig
+
+def average_sales_price(aggs):
+    """Average Sales Price Per Year."""
+    price_plot = aggs.by_year['sale_price_sqr_foot']
+    fig = mpl_figures.acquire()
+    price_plot.plot(ax=fig.add_subplot(),
+                    ylabel='Sale Price per SqFt',
+                    xlabel='Year',
+                    marker='o', 
+                    title='Average Sale Price per SqFt by Year'
+                   )
+    return fig
+
+def average_rent_and_price(aggs):
+    """Average Gross Rent and Sale Price on same plot"""
+    # create subplot and right y axis objects with add_subplot() and twinx()
+    fig = mpl_figures.acquire()
+    ax = fig.add_subplot()
+    ax2=ax.twinx()
+    
+    # set labels for y axes
+    ax.set_ylabel('Sale Price per SqFt', color='blue', fontsize = 14)
+    ax2.set_ylabel('Gross Rent', color='red', fontsize = 14)
+    
+    # Sale price left y axis subplot with x axis label and title for full plot
+    price_plot = aggs.by_year['sale_price_sqr_foot']
+    price_plot.plot(title='Sales Price (blue, left) and Gross Rent (red, right) by Year',
+                    xlabel='Year',
+                    color="blue", 
+                    marker="o",
+                    ax=ax
+                   )
+    # Gross Rent right y axis subplot
+    rent_plot = aggs.by_year['gross_rent']
+    rent_plot.plot(color='red', 
+                   marker='o',
+                   ax=ax2)
+    
+    return fig
+    
+def neighborhood_lines(aggs, measure, neighborhood=None, max_points=MAX_LINE_POINTS):
+    """Line data for one neighborhood (downsampled when long), or for all of them."""
+    if neighborhood is None:
+        # Every neighborhood's series is embedded behind hvplot's groupby widget
+        return aggs.by_year_neighborhood.reset_index(), {'groupby': 'neighborhood'}
+    series = aggs.by_year_neighborhood.xs(neighborhood, level='neighborhood')[measure].dropna()
+    kept = downsample.lttb(series.index, series.values, max_points)
+    return series.iloc[kept].reset_index(), {'title': neighborhood}
+
+def average_price_by_neighborhood(aggs, neighborhood=None):
+    """Average Prices by Neighborhood."""
+    hv = backends.holoviews()
+    sfo_grouped, grouping = neighborhood_lines(aggs, 'sale_price_sqr_foot', neighborhood)
+    fig = sfo_grouped.hvplot.line(x='year',
+                                  xlabel='Year', 
+                                  y='sale_price_sqr_foot', 
+                                  ylabel='Mean Sale Price per Sq Ft',
+                                  **grouping
+                                 )
+    return render_bokeh(hv, fig)
+
+def average_rent_by_neighborhood(aggs, neighborhood=None):
+    hv = backends.holoviews()
+    sfo_grouped, grouping = neighborhood_lines(aggs, 'gross_rent', neighborhood)
+    fig = sfo_grouped.hvplot.line(x='year', 
+                                  xlabel='Year',
+                                  y='gross_rent',
+                                  ylabel='Mean Gross Rent',
+                                  **grouping
+                                 )
+    return render_bokeh(hv, fig)
+
+def top_most_expensive_neighborhoods(aggs):
+    """Top 10 Neighborhoods by the metric they are ranked by (sale price unless filtered)."""
+    hv = backends.holoviews()
+    top_10 = aggs.top_neighborhoods.reset_index()
+    fig = top_10.hvplot.bar(x='neighborhood',
+                            xlabel='Neighborhood',
+                            rot=37,
+                            y=aggs.top_metric,
+                            ylabel=ranking.LABELS[aggs.top_metric],
+                            title=f'{title_top(aggs)}, Avg {title_years(aggs)}',
+                            frame_width=600,
+                            frame_height=250
+                           )
+    return render_bokeh(hv, fig)
+
+def most_expensive_neighborhoods_rent_sales(aggs):
+    """Comparison of Rent and Sales Prices of Most Expensive Neighborhoods."""
+    hv = backends.holoviews()
+    top_10_full = aggs.top_by_year.reset_index()
+    top_10_full_1 = top_10_full.drop(columns='housing_units').rename(columns={'sale_price_sqr_foot' : 'Mean Sales Price per Sq Ft', 'gross_rent' : 'Gross Rent' })
+    fig = top_10_full_1.hvplot.bar(x='year', 
+                                   rot=90, 
+                                   groupby='neighborhood',
+                                   height=500,
+                                   title=f'Sale Price and Rent of {title_top(aggs)}, yearly {title_years(aggs)}'
+                                  )
+    return render_bokeh(hv, fig)
+    
+def parallel_coordinates(aggs):
+    """Parallel Coordinates Plot."""
+    px = backends.plotly_express()
+    top_10 = aggs.top_neighborhoods.reset_index()
+    top_10['gross_rent'] = top_10['gross_rent'].round(2)
+    top_10['sale_price_sqr_foot'] = top_10['sale_price_sqr_foot'].round(2)
+    fig = px.parallel_coordinates(top_10,
+                                  title=f'Parallel Coordinates: {title_top(aggs)}',
+                                  dimensions=['sale_price_sqr_foot', 
+                                              'housing_units', 
+                                              'gross_rent'
+                                             ],
+                                  color=aggs.top_metric,
+                                  color_continuous_scale=px.colors.sequential.Inferno,
+                                  labels={"sale_price_sqr_foot": "Sale Price per Sq Ft",
+                                          "housing_units": "Housing Units",
+                                          "gross_rent": 'Gross Rent',
+                                          "rent_to_price": ranking.LABELS['rent_to_price']
+                                         },
+                                 )
+    return fig
+
+def parallel_categories(aggs):
+    """Parallel Categories Plot."""
+    px = backends.plotly_express()
+    top_10 = aggs.top_neighborhoods.reset_index()
+    top_10['gross_rent'] = top_10['gross_rent'].round(2)
+    top_10['sale_price_sqr_foot'] = top_10['sale_price_sqr_foot'].round(2)
+    fig = px.parallel_categories(top_10,
+                                 title=f'Parallel Categories: {title_top(aggs)}',
+                                 dimensions=['neighborhood',
+                                             'sale_price_sqr_foot',
+                                             'housing_units',
+                                             'gross_rent'
+                                            ],
+                                 color=aggs.top_metric,
+                                 color_continuous_scale=px.colors.sequential.Inferno,
+                                 labels={"neighborhood": "Neighborhood",
+                                         "sale_price_sqr_foot": "Sale Price per Sq Ft",
+                                         "housing_units": "Housing Units",
+                                         "gross_rent": 'Gross Rent',
+                                         "rent_to_price": ranking.LABELS['rent_to_price']
+                                        }
+                                )
+    return fig
+                           
+def visible_locations(aggs, center, zoom):
+    """Locations inside the map viewport, clustered when there are too many to draw."""
+    bounds = spatial.viewport_bounds(center[0], center[1], zoom)
+    sfo_location = aggs.locations.iloc[aggs.location_index.query(*bounds)]
+    if len(sfo_location) <= MAX_MAP_POINTS:
+        return sfo_location
+    ids = spatial.cluster_ids(sfo_location['Lat'], sfo_location['Lon'], zoom)
+    clusters = sfo_location.groupby(ids).mean()
+    sizes = sfo_location.groupby(ids).size()
+    clusters.index = [f'{size} neighborhoods' for size in sizes]
+    return clusters
+
+def neighborhood_map(aggs, center=None, zoom=10):
+    """Neighborhood Map."""
+    px = backends.plotly_express()
+    if center is None:
+        center = (aggs.locations['Lat'].mean(), aggs.locations['Lon'].mean())
+    sfo_location = visible_locations(aggs, center, zoom)
+    map_plot = px.scatter_mapbox(sfo_location,
+                                 title=f'Mean Sale Price (marker size) and Gross Rent (marker color) in {title_city(aggs)}{title_years(aggs)}',
+                                 lat="Lat",
+                                 lon="Lon",
+                                 hover_name=sfo_location.index,
+                                 #Coordinates removed from hover data, end users unlikely to want precise lat/lon
+                                 hover_data={'Lat': False,
+                                             'Lon': False,
+                                            },
+                                 size='sale_price_sqr_foot',
+                                 size_max=15,
+                                 color='gross_rent',
+                                 color_continuous_scale='rainbow',
+                                 center={'lat': center[0], 'lon': center[1]},
+                                 zoom=zoom
+                                )
+    return map_plot
+
+def sunburst(aggs):
+    """Sunburst Plot."""
+    px = backends.plotly_express()
+    top_10_full = aggs.top_by_year.reset_index()
+    fig = px.sunburst(top_10_full,
+                      path=['year', 'neighborhood'],
+                      title=f'{title_top(aggs)} by Year, Gross Rent (color)',
+                      color='gross_rent',
+                      color_continuous_scale='blues',
+                     )
+    return fig
+
+def top_investment_neighborhoods(aggs, metric='gross_yield', n=10):
+    """Top 10 Neighborhoods by an Investment Metric."""
+    hv = backends.holoviews()
+    label, higher_first = investment.METRICS[metric]
+    values = aggs.investment.by_neighborhood[metric]
+    top = ranking.top_positions(values.to_numpy() if higher_first else -values.to_numpy(), n)
+    top_n = values.iloc[top].reset_index()
+    fig = top_n.hvplot.bar(x='neighborhood',
+                           xlabel='Neighborhood',
+                           rot=37,
+                           y=metric,
+                           ylabel=label,
+                           title=f'Top {len(top_n)} {title_city(aggs)}Neighborhoods by {label}, {title_years(aggs)}',
+                           frame_width=600,
+                           frame_height=250
+                          )
+    return render_bokeh(hv, fig)
+
+def investment_map(aggs, metric='gross_yield', center=None, zoom=10):
+    """Neighborhood Map of an Investment Metric."""
+    px = backends.plotly_express()
+    label, higher_first = investment.METRICS[metric]
+    if center is None:
+        center = (aggs.locations['Lat'].mean(), aggs.locations['Lon'].mean())
+    sfo_location = visible_locations(aggs, center, zoom).dropna(subset=[metric])
+    map_plot = px.scatter_mapbox(sfo_location,
+                                 title=f'{label} (marker color) and Mean Sale Price (marker size) in {title_city(aggs)}{title_years(aggs)}',
+                                 lat="Lat",
+                                 lon="Lon",
+                                 hover_name=sfo_location.index,
+                                 hover_data={'Lat': False,
+                                             'Lon': False,
+                                            },
+                                 size='sale_price_sqr_foot',
+                                 size_max=15,
+                                 color=metric,
+                                 color_continuous_scale='viridis' if higher_first else 'viridis_r',
+                                 labels={metric: label},
+                                 center={'lat': center[0], 'lon': center[1]},
+                                 zoom=zoom
+                                )
+    return map_plot
+
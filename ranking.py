@@ -0,0 +1,96 @@
+"""Top-N neighborhood rankings computed with NumPy reductions.
+
+A Ranker keeps the neighborhood codes of a cell table. Each ranking
+then takes per-neighborhood means of only the measures its metric needs
+(np.bincount over the codes) and selects the top N with np.argpartition
+instead of sorting every neighborhood.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+# Metrics that are not a single measure, as (numerator, denominator) measures
+RATIO_METRICS = {'rent_to_price': ('gross_rent', 'sale_price_sqr_foot')}
+
+# Axis labels of every metric neighborhoods can be ranked by
+LABELS = {'sale_price_sqr_foot': 'Mean Sale Price per Sq Ft',
+          'gross_rent': 'Mean Gross Rent',
+          'housing_units': 'Mean Housing Units',
+          'rent_to_price': 'Gross Rent to Sale Price per Sq Ft'
+         }
+
+Ranking = namedtuple('Ranking', ['neighborhoods', 'rows'])
+
+
+def metric_scores(metric, means):
+    """Scores for a measure or ratio metric; means(measure) gives that measure's means."""
+    if metric in RATIO_METRICS:
+        numerator, denominator = RATIO_METRICS[metric]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return means(numerator) / means(denominator)
+    return means(metric)
+
+
+def add_ratios(table):
+    """Per-neighborhood table of measure means with a column for each ratio metric."""
+    for metric in RATIO_METRICS:
+        table[metric] = metric_scores(metric, table.__getitem__)
+    return table
+
+
+def top_positions(scores, n):
+    """Positions of the n highest non-NaN scores, highest first and ties by position."""
+    candidates = np.flatnonzero(~np.isnan(scores))
+    if n < len(candidates):
+        candidates = candidates[np.argpartition(-scores[candidates], n - 1)[:n]]
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+
+class Ranker:
+    """Integer-coded view of a cell table for repeated rankings."""
+
+    def __init__(self, cells, dictionary, codes):
+        self.year = cells.index.get_level_values('year').to_numpy()
+        # Dictionary codes are in sorted name order, so ties rank
+        # alphabetically like pandas nlargest
+        self.codes = codes
+        self.names = dictionary.names
+        self.cells = cells
+
+    def _mask(self, years):
+        if years is None:
+            return None
+        return (self.year >= years[0]) & (self.year <= years[1])
+
+    def means(self, measure, years=None):
+        """Mean of a measure per neighborhood code, NaN where it has no values."""
+        sums = self.cells[f'{measure}_sum'].to_numpy(dtype='float64')
+        counts = self.cells[f'{measure}_count'].to_numpy(dtype='float64')
+        codes = self.codes
+        mask = self._mask(years)
+        if mask is not None:
+            codes, sums, counts = codes[mask], sums[mask], counts[mask]
+        size = len(self.names)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.bincount(codes, sums, size) / np.bincount(codes, counts, size)
+
+    def scores(self, metric, years=None):
+        """Score per neighborhood code for a measure or a ratio metric."""
+        return metric_scores(metric, lambda measure: self.means(measure, years))
+
+    def rank(self, metric='sale_price_sqr_foot', n=10, years=None):
+        """Top n neighborhoods by metric over an inclusive (first, last) year range.
+
+        rows holds the positions in the cell table of those neighborhoods'
+        cells within the year range, for the per-year detail views.
+        """
+        scores = self.scores(metric, years)
+        top = top_positions(scores, n)
+
+        selected = np.zeros(len(self.names), dtype=bool)
+        selected[top] = True
+        in_rows = selected[self.codes]
+        mask = self._mask(years)
+        if mask is not None:
+            in_rows &= mask
+        return Ranking(self.names[top], np.flatnonzero(in_rows))
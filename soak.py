@@ -0,0 +1,63 @@
+"""Soak test for the matplotlib views: resident memory must stay flat.
+
+    python soak.py [--reruns 2000] [--max-growth-mb 20]
+
+Renders every matplotlib view the way a dashboard rerun does on a figure
+cache miss (build, serialize to PNG, release) over and over, and samples the
+process's resident memory. Exits non-zero if memory after the warm-up reruns
+grows by more than the allowed amount.
+"""
+import argparse
+import os
+import resource
+import sys
+
+import aggregates
+import data_loader
+import figure_cache
+import plots
+
+PYPLOT_VIEWS = ['housing_units_per_year',
+                'average_gross_rent',
+                'average_sales_price',
+                'average_rent_and_price'
+               ]
+
+
+def resident_mb():
+    """Current resident set size of this process in MB."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        # Peak rather than current usage, but still catches steady growth
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reruns', type=int, default=2000)
+    parser.add_argument('--warmup', type=int, default=50)
+    parser.add_argument('--max-growth-mb', type=float, default=20.0)
+    args = parser.parse_args(argv)
+
+    aggs = aggregates.get_aggregates(data_loader.load_dataset(data_loader.CENSUS_PATH,
+                                                              data_loader.COORDINATES_PATH))
+    views = [getattr(plots, name) for name in PYPLOT_VIEWS]
+    baseline = None
+    for rerun in range(1, args.reruns + 1):
+        for view in views:
+            figure_cache.serialize(view(aggs))
+        if rerun == args.warmup:
+            baseline = resident_mb()
+        if rerun % 250 == 0:
+            print(f"rerun {rerun}: {resident_mb():.1f} MB")
+
+    growth = resident_mb() - (baseline if baseline is not None else 0.0)
+    print(f"growth after warm-up: {growth:.1f} MB")
+    return 0 if growth <= args.max_growth_mb else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""Spatial index and viewport helpers for the neighborhood map."""
+import math
+
+import numpy as np
+
+# Mapbox GL renders the world 512 pixels wide at zoom 0
+TILE_SIZE = 512
+
+
+def degrees_per_pixel(zoom):
+    """Degrees of longitude covered by one screen pixel at a map zoom level."""
+    return 360 / (TILE_SIZE * 2**zoom)
+
+
+def viewport_bounds(center_lat, center_lon, zoom, width=700, height=450):
+    """(south, west, north, east) box visible in a map of the given pixel size."""
+    step = degrees_per_pixel(zoom)
+    half_lon = width / 2 * step
+    half_lat = height / 2 * step * math.cos(math.radians(center_lat))
+    return (center_lat - half_lat, center_lon - half_lon, center_lat + half_lat, center_lon + half_lon)
+
+
+def cluster_ids(lat, lon, zoom, cell_pixels=40):
+    """Cluster number for each point, grouping points that share a screen cell."""
+    cell = cell_pixels * degrees_per_pixel(zoom)
+    cells = np.stack([np.floor(np.asarray(lat) / cell), np.floor(np.asarray(lon) / cell)], axis=1)
+    return np.unique(cells, axis=0, return_inverse=True)[1].ravel()
+
+
+class GridIndex:
+    """Uniform latitude/longitude grid over a set of points.
+
+    Points are sorted by grid cell, so each row of cells inside a query box is
+    one contiguous slice located with a binary search.
+    """
+
+    def __init__(self, lat, lon, cell_degrees=0.01):
+        self.lat = np.asarray(lat, dtype='float64')
+        self.lon = np.asarray(lon, dtype='float64')
+        self.cell_degrees = cell_degrees
+        self.lat0 = self.lat.min() if len(self.lat) else 0.0
+        self.lon0 = self.lon.min() if len(self.lon) else 0.0
+        rows = self._cell(self.lat, self.lat0)
+        cols = self._cell(self.lon, self.lon0)
+        self.n_rows = int(rows.max()) + 1 if len(rows) else 1
+        self.n_cols = int(cols.max()) + 1 if len(cols) else 1
+        cells = rows * self.n_cols + cols
+        self.order = np.argsort(cells, kind='stable')
+        self.cells = cells[self.order]
+
+    def _cell(self, values, origin):
+        return np.floor((values - origin) / self.cell_degrees).astype('int64')
+
+    def query(self, south, west, north, east):
+        """Positions of the points inside the box, in ascending order."""
+        if not len(self.order):
+            return self.order
+        row0, row1 = np.clip(self._cell(np.array([south, north]), self.lat0), 0, self.n_rows - 1)
+        col0, col1 = np.clip(self._cell(np.array([west, east]), self.lon0), 0, self.n_cols - 1)
+        row_starts = np.arange(row0, row1 + 1) * self.n_cols
+        lo = np.searchsorted(self.cells, row_starts + col0, side='left')
+        hi = np.searchsorted(self.cells, row_starts + col1, side='right')
+        candidates = np.concatenate([self.order[a:b] for a, b in zip(lo, hi)])
+        inside = ((self.lat[candidates] >= south) & (self.lat[candidates] <= north)
+                  & (self.lon[candidates] >= west) & (self.lon[candidates] <= east))
+        return np.sort(candidates[inside])
@@ -0,0 +1,108 @@
+"""Background warm-up of the figure cache.
+
+When a city's data version changes, every dashboard view is rendered concurrently
+in a process pool (matplotlib and Bokeh rendering are CPU-bound and hold the
+GIL) and the serialized figures are put in the dataset's figure cache, so the
+first user to open a view gets it ready-made. Set DASHBOARD_WARMUP_WORKERS to the
+number of worker processes to enable it.
+"""
+import concurrent.futures
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+
+import aggregates
+import data_loader
+import figure_cache
+import plots
+
+WORKERS = int(os.getenv('DASHBOARD_WARMUP_WORKERS', '0'))
+
+logger = logging.getLogger(__name__)
+
+
+def render(census_path, coordinates_path, name, params, place=None):
+    """Render one view in a worker process; returns its data version and CachedFigure."""
+    dataset = data_loader.load_dataset(census_path, coordinates_path, columns=['neighborhood'] + aggregates.MEASURES)
+    aggs = aggregates.get_aggregates(dataset, place)
+    return dataset.version, figure_cache.serialize(getattr(plots, name)(aggs, **params))
+
+
+class _Run:
+    """Views of one city's data version queued in the pool."""
+
+    def __init__(self, version):
+        self.version = version
+        self.pending = {}
+        self.done = 0
+        self.total = 0
+
+
+class Warmup:
+    """Renders all views of each city's data version in a process pool, once per version."""
+
+    def __init__(self, workers):
+        self.workers = workers
+        # Latest run per city, by census path
+        self._runs = {}
+        self._executor = None
+        # Reentrant: a future that is already done runs its callback inside submit
+        self._lock = threading.RLock()
+
+    def start(self, census_path, coordinates_path, version, views, figures, place=None):
+        """Queue every view not already in figures, unless this version was already started.
+
+        Starting another version of the same city cancels the views still
+        queued for its previous one; other cities' runs are left alone.
+        """
+        city = str(census_path)
+        with self._lock:
+            run = self._runs.get(city)
+            if run is not None and run.version == version:
+                return
+            if self._executor is None:
+                # Spawned rather than forked: the Streamlit server is multi-threaded
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context('spawn'))
+            if run is not None:
+                for future in run.pending.values():
+                    future.cancel()
+            run = self._runs[city] = _Run(version)
+            for name, params in views:
+                key = figure_cache.figure_key(name, params, version)
+                if key in figures:
+                    continue
+                future = self._executor.submit(render, str(census_path), str(coordinates_path), name, params, place)
+                run.pending[key] = future
+                run.total += 1
+                future.add_done_callback(functools.partial(self._finished, run, key, figures))
+
+    def _finished(self, run, key, figures, future):
+        if not future.cancelled():
+            try:
+                version, entry = future.result()
+                figures.put(figure_cache.figure_key(key[0], dict(key[1]), version), entry)
+            except Exception:
+                logger.exception("Warm-up render of %s failed", key[0])
+        with self._lock:
+            if run.pending.get(key) is future:
+                del run.pending[key]
+                run.done += 1
+
+    def is_pending(self, key):
+        """Whether key is still being rendered by the pool."""
+        with self._lock:
+            return any(key in run.pending for run in self._runs.values())
+
+    def progress(self, version):
+        """(finished, total) views of the warm-up of a data version."""
+        with self._lock:
+            for run in self._runs.values():
+                if run.version == version:
+                    return run.done, run.total
+            return 0, 0
+
+
+warmer = Warmup(WORKERS) if WORKERS > 0 else None